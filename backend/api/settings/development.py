@@ -4,6 +4,7 @@ from decimal import Decimal
 from datetime import timedelta
 
 import environ
+import dj_database_url
 
 from corsheaders.defaults import default_headers
 
@@ -80,13 +81,24 @@ MIDDLEWARE = APP_MIDDLEWARE + BASE_MIDDLEWARE  # noqa: F405
 #         'PORT': env('DB_PORT'),
 #     }
 # }
+# SQLite unless DB_URL is set, e.g. to a local Postgres
 DATABASES = {
-    'default': {
+    'default': dj_database_url.parse(
+        url=env('DB_URL'), conn_max_age=600, conn_health_checks=True
+    )
+    if env('DB_URL', default='')
+    else {
         'ENGINE': 'django.db.backends.sqlite3',
         'NAME': BASE_DIR / 'db.sqlite3',  # noqa: F405
     }
 }
 
+# ==========================================================
+# CACHE - shared cache backend (.env)
+# ==========================================================
+# e.g. redis://localhost:6379/1, filecache:///tmp/triplog, locmemcache://
+CACHES = {'default': env.cache('CACHE_URL', default='locmemcache://')}
+
 # ==========================================================
 # REDIRECT URL - django redirect url
 # ==========================================================
@@ -137,6 +149,11 @@ LOGGING = {
             'handlers': ['console', 'file'],
             'propagate': False,
         },
+        'apps': {
+            'level': 'INFO',
+            'handlers': ['console', 'file'],
+            'propagate': False,
+        },
     },
 }
 
@@ -321,6 +338,78 @@ SWAGGER_SETTINGS = {
 # UTILS
 # ==========================================================
 ORS_API_KEY = env('ORS_API_KEY')
+# Directions service, e.g. the local stand-in of `manage.py serve_ors`
+ORS_BASE_URL = env('ORS_BASE_URL', default='https://api.openrouteservice.org')
+
+# Route cache for ORS directions, keyed on snapped coordinates and profile
+ROUTE_CACHE_ENABLED = env.bool('ROUTE_CACHE_ENABLED', default=True)
+ROUTE_CACHE_PRECISION = env.int('ROUTE_CACHE_PRECISION', default=4)
+ROUTE_CACHE_TTL = env.int('ROUTE_CACHE_TTL', default=604800)
+# Expired routes are kept this long to be served while ORS is unavailable
+ROUTE_CACHE_STALE_TTL = env.int('ROUTE_CACHE_STALE_TTL', default=2592000)
+ROUTE_CACHE_MEMORY_SIZE = env.int('ROUTE_CACHE_MEMORY_SIZE', default=256)
+ROUTE_CACHE_MAX_ENTRIES = env.int('ROUTE_CACHE_MAX_ENTRIES', default=10000)
+# Table hits are written, and the table trimmed, once per batch of this many
+# lookups or stores, or after the interval in seconds
+ROUTE_CACHE_BATCH_SIZE = env.int('ROUTE_CACHE_BATCH_SIZE', default=100)
+ROUTE_CACHE_FLUSH_INTERVAL = env.int('ROUTE_CACHE_FLUSH_INTERVAL', default=60)
+
+# Worker threads used to fetch the distinct legs of a batch concurrently
+ROUTE_FETCH_WORKERS = env.int('ROUTE_FETCH_WORKERS', default=4)
+
+# Batch trip calculation, planner processes and maximum trips per request
+TRIP_BATCH_WORKERS = env.int('TRIP_BATCH_WORKERS', default=os.cpu_count() or 1)
+TRIP_BATCH_MAX_SIZE = env.int('TRIP_BATCH_MAX_SIZE', default=100)
+
+# Route geometry simplification levels served by the summary, in degrees
+ROUTE_SIMPLIFY_TOLERANCES = env.list(
+    'ROUTE_SIMPLIFY_TOLERANCES', cast=float, default=[0.0001, 0.001, 0.01]
+)
+
+# Seconds browsers and proxies may reuse a trip response before revalidating
+HTTP_CACHE_MAX_AGE = env.int('HTTP_CACHE_MAX_AGE', default=60)
+
+# Seconds the serialized trip list and summary responses are kept in the cache
+TRIP_RESPONSE_CACHE_TTL = env.int('TRIP_RESPONSE_CACHE_TTL', default=300)
+
+# `calculate` responses are replayed for an `Idempotency-Key` during the key
+# TTL, a key whose request never finished is released after the processing
+# timeout, seconds
+IDEMPOTENCY_KEY_TTL = env.int('IDEMPOTENCY_KEY_TTL', default=86400)
+IDEMPOTENCY_PROCESSING_TIMEOUT = env.int('IDEMPOTENCY_PROCESSING_TIMEOUT', default=120)
+
+# Increase over the stored baseline, as a fraction, failing the planner
+# benchmark of `manage.py benchmark_planner`
+PLANNER_BENCHMARK_THRESHOLD = env.float('PLANNER_BENCHMARK_THRESHOLD', default=0.25)
+
+# Serve `calculate` with the native async view, for ASGI deployments
+TRIP_ASYNC_CALCULATE = env.bool('TRIP_ASYNC_CALCULATE', default=False)
+
+# Identical concurrent calculations are coalesced: callers wait for the one
+# running up to the timeout, its outcome is kept for the result TTL, seconds
+TRIP_FLIGHT_TIMEOUT = env.int('TRIP_FLIGHT_TIMEOUT', default=120)
+TRIP_FLIGHT_RESULT_TTL = env.int('TRIP_FLIGHT_RESULT_TTL', default=5)
+
+# ORS HTTP client: keep-alive pool size, timeouts in seconds and retries on
+# connection errors, 429 and 5xx, backed off by `backoff * 2**n + jitter`
+ORS_POOL_MAXSIZE = env.int('ORS_POOL_MAXSIZE', default=16)
+ORS_CONNECT_TIMEOUT = env.float('ORS_CONNECT_TIMEOUT', default=3.05)
+ORS_READ_TIMEOUT = env.float('ORS_READ_TIMEOUT', default=30)
+ORS_MAX_RETRIES = env.int('ORS_MAX_RETRIES', default=2)
+ORS_RETRY_BACKOFF = env.float('ORS_RETRY_BACKOFF', default=0.5)
+ORS_RETRY_JITTER = env.float('ORS_RETRY_JITTER', default=0.5)
+# Longest wait before a retry, also when ORS asks for more with Retry-After
+ORS_RETRY_AFTER_MAX = env.float('ORS_RETRY_AFTER_MAX', default=5)
+
+# Connections the async `calculate` view opens to ORS per event loop
+ORS_ASYNC_MAX_CONNECTIONS = env.int('ORS_ASYNC_MAX_CONNECTIONS', default=200)
+
+# ORS circuit breaker: opens once the failure rate over the last calls is
+# reached, then fails fast for the reset timeout in seconds
+ORS_BREAKER_FAILURE_RATE = env.float('ORS_BREAKER_FAILURE_RATE', default=0.5)
+ORS_BREAKER_WINDOW = env.int('ORS_BREAKER_WINDOW', default=20)
+ORS_BREAKER_MIN_CALLS = env.int('ORS_BREAKER_MIN_CALLS', default=5)
+ORS_BREAKER_RESET_TIMEOUT = env.int('ORS_BREAKER_RESET_TIMEOUT', default=30)
 
 # FMCSA HOS Rules for Property-Carrying Drivers
 MAX_DRIVING_HOURS_PER_DAY = Decimal('11.0')
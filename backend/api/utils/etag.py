@@ -0,0 +1,40 @@
+import hashlib
+
+from django.conf import settings
+from rest_framework import status
+from django.utils.http import quote_etag, parse_etags
+from django.utils.cache import patch_cache_control
+from rest_framework.response import Response
+
+
+def make_etag(*parts):
+    """Strong ETag built from the given parts, e.g. an id and `updated_at`."""
+    value = ':'.join(str(part) for part in parts)
+
+    return quote_etag(hashlib.sha1(value.encode()).hexdigest())
+
+
+def etag_matches(request, etag):
+    """Whether the `If-None-Match` header of the request matches `etag`."""
+    header = request.headers.get('If-None-Match')
+    if not header:
+        return False
+
+    etags = parse_etags(header)
+
+    # If-None-Match uses the weak comparison
+    return '*' in etags or etag.removeprefix('W/') in (
+        tag.removeprefix('W/') for tag in etags
+    )
+
+
+def set_cache_headers(response, etag):
+    """Let browsers and proxies reuse the response, then revalidate it."""
+    response['ETag'] = etag
+    patch_cache_control(response, public=True, max_age=settings.HTTP_CACHE_MAX_AGE)
+
+    return response
+
+
+def not_modified(etag):
+    return set_cache_headers(Response(status=status.HTTP_304_NOT_MODIFIED), etag)
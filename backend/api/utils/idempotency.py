@@ -0,0 +1,213 @@
+import json
+import hashlib
+import inspect
+
+from functools import wraps
+
+from django.conf import settings
+from rest_framework import status
+from django.core.cache import cache
+from rest_framework.response import Response
+
+
+IDEMPOTENCY_HEADER = 'Idempotency-Key'
+
+MAX_KEY_LENGTH = 255
+
+# Response headers stored and replayed with the response
+REPLAYED_HEADERS = ('Location', 'Retry-After')
+
+
+def get_idempotency_key(request, scope):
+    """
+    Cache key of the `Idempotency-Key` header, per scope and per user, or
+    None when the request has none. Raises ValueError on an invalid key.
+    """
+    key = request.headers.get(IDEMPOTENCY_HEADER)
+    if not key:
+        return None
+
+    if len(key) > MAX_KEY_LENGTH:
+        raise ValueError(f'{IDEMPOTENCY_HEADER} is longer than {MAX_KEY_LENGTH}.')
+
+    user = request.user.pk if request.user.is_authenticated else 'anon'
+    digest = hashlib.sha1(key.encode()).hexdigest()
+
+    return f'idempotency:{scope}:{user}:{digest}'
+
+
+def get_fingerprint(data):
+    """Fingerprint of a request body, a key may only replay the same body."""
+    body = json.dumps(data, sort_keys=True, default=str)
+
+    return hashlib.sha1(body.encode()).hexdigest()
+
+
+def claim(key, fingerprint):
+    """
+    Reserve `key` with a placeholder, atomically so that only one request
+    runs. Returns None once claimed, otherwise the record already stored.
+    """
+    placeholder = {'fingerprint': fingerprint, 'response': None}
+    if cache.add(key, placeholder, timeout=settings.IDEMPOTENCY_PROCESSING_TIMEOUT):
+        return None
+
+    # Expired in between, the request is treated as still processing
+    return cache.get(key) or placeholder
+
+
+async def aclaim(key, fingerprint):
+    placeholder = {'fingerprint': fingerprint, 'response': None}
+    if await cache.aadd(
+        key, placeholder, timeout=settings.IDEMPOTENCY_PROCESSING_TIMEOUT
+    ):
+        return None
+
+    return await cache.aget(key) or placeholder
+
+
+def make_record(fingerprint, data, status_code, headers):
+    """
+    Record stored for a key, or None when the response must not be replayed.
+    Only successes and client errors are kept: server and upstream errors,
+    and throttling, are transient and the request may be retried.
+    """
+    if status_code >= 500 or status_code == status.HTTP_429_TOO_MANY_REQUESTS:
+        return None
+
+    headers = {name: headers[name] for name in REPLAYED_HEADERS if name in headers}
+
+    return {'fingerprint': fingerprint, 'response': (data, status_code, headers)}
+
+
+def get_replay(record, fingerprint):
+    """`(data, status_code, headers)` answering a request with a used key."""
+    if record['fingerprint'] != fingerprint:
+        return (
+            {
+                'error': 'Idempotency key reused',
+                'detail': f'{IDEMPOTENCY_HEADER} was used with another request.',
+            },
+            status.HTTP_422_UNPROCESSABLE_ENTITY,
+            {},
+        )
+
+    if record['response'] is None:
+        return (
+            {
+                'error': 'Request in progress',
+                'detail': f'A request with this {IDEMPOTENCY_HEADER} is running.',
+            },
+            status.HTTP_409_CONFLICT,
+            {'Retry-After': '1'},
+        )
+
+    data, status_code, headers = record['response']
+
+    return data, status_code, {**headers, 'Idempotent-Replayed': 'true'}
+
+
+def invalid_key_response(error):
+    return Response(
+        {'error': 'Invalid idempotency key', 'detail': str(error)},
+        status=status.HTTP_400_BAD_REQUEST,
+    )
+
+
+def replay_response(record, fingerprint):
+    data, status_code, headers = get_replay(record, fingerprint)
+
+    return Response(data, status=status_code, headers=headers)
+
+
+def make_response_record(fingerprint, response):
+    return make_record(fingerprint, response.data, response.status_code, response)
+
+
+def make_sync_wrapper(method, scope):
+    @wraps(method)
+    def wrapper(self, request, *args, **kwargs):
+        try:
+            key = get_idempotency_key(request, scope)
+        except ValueError as e:
+            return invalid_key_response(e)
+
+        if key is None:
+            return method(self, request, *args, **kwargs)
+
+        fingerprint = get_fingerprint(request.data)
+
+        record = claim(key, fingerprint)
+        if record is not None:
+            return replay_response(record, fingerprint)
+
+        try:
+            response = method(self, request, *args, **kwargs)
+        except Exception:
+            cache.delete(key)
+            raise
+
+        record = make_response_record(fingerprint, response)
+        if record is None:
+            cache.delete(key)
+        else:
+            cache.set(key, record, timeout=settings.IDEMPOTENCY_KEY_TTL)
+
+        return response
+
+    return wrapper
+
+
+def make_async_wrapper(method, scope):
+    @wraps(method)
+    async def wrapper(self, request, *args, **kwargs):
+        try:
+            key = get_idempotency_key(request, scope)
+        except ValueError as e:
+            return invalid_key_response(e)
+
+        if key is None:
+            return await method(self, request, *args, **kwargs)
+
+        fingerprint = get_fingerprint(request.data)
+
+        record = await aclaim(key, fingerprint)
+        if record is not None:
+            return replay_response(record, fingerprint)
+
+        try:
+            response = await method(self, request, *args, **kwargs)
+        except Exception:
+            await cache.adelete(key)
+            raise
+
+        record = make_response_record(fingerprint, response)
+        if record is None:
+            await cache.adelete(key)
+        else:
+            await cache.aset(key, record, timeout=settings.IDEMPOTENCY_KEY_TTL)
+
+        return response
+
+    return wrapper
+
+
+def idempotent(scope):
+    """
+    Honour the `Idempotency-Key` header on a DRF view method, sync or async.
+
+    The first request with a key runs and its response is stored for
+    `IDEMPOTENCY_KEY_TTL` seconds. Requests with the same key then get the
+    stored response without running the view, 409 while it is still running
+    and 422 if they carry another body. Keys live in the default cache, which
+    production requires to be shared, so a retry landing on another worker
+    is still answered from the record.
+    """
+
+    def decorator(method):
+        if inspect.iscoroutinefunction(method):
+            return make_async_wrapper(method, scope)
+
+        return make_sync_wrapper(method, scope)
+
+    return decorator
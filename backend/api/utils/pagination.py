@@ -1,5 +1,14 @@
+import uuid
+
+from base64 import b64decode, b64encode
+from datetime import datetime
+
+from django.db import connection
+from django.db.models import Q
 from rest_framework.response import Response
+from rest_framework.exceptions import NotFound
 from rest_framework.pagination import PageNumberPagination
+from rest_framework.utils.urls import replace_query_param
 
 
 class CustomPagination(PageNumberPagination):
@@ -19,3 +28,144 @@ class CustomPagination(PageNumberPagination):
                 'results': data,
             }
         )
+
+
+class KeysetPagination(CustomPagination):
+    """
+    Page numbers by default, keyset pagination on `(created_at, id)` with
+    `?pagination=cursor` or once a `cursor` is given.
+
+    A keyset page is a single indexed range scan, newest first, with no
+    `COUNT(*)` and no `OFFSET`. The envelope keeps `size`, `next`,
+    `previous` and `results`; `count` is only filled in with `?total=approx`
+    and is then an estimate on PostgreSQL.
+    """
+
+    cursor_query_param = 'cursor'
+    mode_query_param = 'pagination'
+    total_query_param = 'total'
+    invalid_cursor_message = 'Invalid cursor'
+
+    def is_keyset(self, request):
+        return (
+            self.cursor_query_param in request.query_params
+            or request.query_params.get(self.mode_query_param) == 'cursor'
+        )
+
+    def paginate_queryset(self, queryset, request, view=None):
+        self.keyset = self.is_keyset(request)
+        if not self.keyset:
+            return super().paginate_queryset(queryset, request, view)
+
+        self.request = request
+        self.page_size = self.get_page_size(request)
+        self.count = self.get_approximate_count(queryset, request)
+
+        position, reverse = self.decode_cursor(request)
+
+        if position is None:
+            queryset = queryset.order_by('-created_at', '-id')
+        else:
+            created_at, pk = position
+            if reverse:
+                queryset = queryset.filter(
+                    Q(created_at__gt=created_at) | Q(created_at=created_at, id__gt=pk)
+                ).order_by('created_at', 'id')
+            else:
+                queryset = queryset.filter(
+                    Q(created_at__lt=created_at) | Q(created_at=created_at, id__lt=pk)
+                ).order_by('-created_at', '-id')
+
+        # One extra row tells whether there is a page beyond this one
+        results = list(queryset[: self.page_size + 1])
+        has_more = len(results) > self.page_size
+        results = results[: self.page_size]
+
+        if reverse:
+            results.reverse()
+            self.has_next, self.has_previous = True, has_more
+        else:
+            self.has_next, self.has_previous = has_more, position is not None
+
+        self.page_results = results
+
+        return results
+
+    def get_paginated_response(self, data):
+        if not self.keyset:
+            return super().get_paginated_response(data)
+
+        return Response(
+            {
+                'size': self.page_size,
+                'count': self.count,
+                'next': self.get_next_link(),
+                'previous': self.get_previous_link(),
+                'results': data,
+            }
+        )
+
+    def get_next_link(self):
+        if not self.keyset:
+            return super().get_next_link()
+
+        if not self.has_next or not self.page_results:
+            return None
+
+        return self.encode_cursor(self.page_results[-1], reverse=False)
+
+    def get_previous_link(self):
+        if not self.keyset:
+            return super().get_previous_link()
+
+        if not self.has_previous or not self.page_results:
+            return None
+
+        return self.encode_cursor(self.page_results[0], reverse=True)
+
+    def encode_cursor(self, instance, reverse):
+        prefix = 'p' if reverse else 'n'
+        value = f'{prefix}|{instance.created_at.isoformat()}|{instance.id}'
+        cursor = b64encode(value.encode()).decode()
+        url = self.request.build_absolute_uri()
+
+        return replace_query_param(url, self.cursor_query_param, cursor)
+
+    def decode_cursor(self, request):
+        """Return the `(created_at, id)` position and direction of the cursor."""
+        cursor = request.query_params.get(self.cursor_query_param)
+        if not cursor:
+            return None, False
+
+        try:
+            prefix, created_at, pk = b64decode(cursor.encode()).decode().split('|')
+            position = (datetime.fromisoformat(created_at), uuid.UUID(pk))
+        except (TypeError, ValueError):
+            raise NotFound(self.invalid_cursor_message)
+
+        if prefix not in ('n', 'p'):
+            raise NotFound(self.invalid_cursor_message)
+
+        return position, prefix == 'p'
+
+    def get_approximate_count(self, queryset, request):
+        """
+        Total rows with `?total=approx`, read from the planner statistics on
+        PostgreSQL when the queryset is not filtered.
+        """
+        if request.query_params.get(self.total_query_param) != 'approx':
+            return None
+
+        if connection.vendor == 'postgresql' and not queryset.query.where:
+            with connection.cursor() as cursor:
+                cursor.execute(
+                    'SELECT reltuples::bigint FROM pg_class WHERE relname = %s',
+                    [queryset.model._meta.db_table],
+                )
+                row = cursor.fetchone()
+
+            # reltuples is -1 until the table is first analyzed
+            if row and row[0] >= 0:
+                return row[0]
+
+        return queryset.count()
@@ -27,3 +27,9 @@ class User(AbstractUser):
     )
     created_at = models.DateTimeField(editable=False, auto_now_add=True)
     updated_at = models.DateTimeField(editable=False, auto_now=True)
+
+    class Meta(AbstractUser.Meta):
+        indexes = [
+            # Keyset pagination of the user list
+            models.Index(fields=['-created_at', '-id'], name='user_created_at_id_idx'),
+        ]
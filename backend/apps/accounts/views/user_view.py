@@ -8,6 +8,8 @@ from rest_framework.viewsets import ModelViewSet
 from rest_framework.decorators import action
 from rest_framework.permissions import IsAuthenticated
 
+from api.utils.pagination import KeysetPagination
+
 from apps.accounts.filters.user_filter import UserFilter
 from apps.accounts.serializers.user_serializer import (
     UserSerializer,
@@ -24,6 +26,7 @@ class UserViewSet(ModelViewSet):
     filterset_class = UserFilter
     order_by = ['-date_joined']
     permission_classes = [IsAuthenticated]
+    pagination_class = KeysetPagination
 
     def get_serializer_class(self):
         if self.action == 'list':
@@ -0,0 +1,113 @@
+import json
+
+from pathlib import Path
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+from apps.trip.utils.benchmark_utils import (
+    BENCHMARK_CASES,
+    parse_case,
+    run_benchmarks,
+    compare_to_baseline,
+)
+
+
+# Stored with the app, next to the code it measures
+DEFAULT_BASELINE = (
+    Path(__file__).resolve().parents[2] / 'benchmarks' / 'planner_baseline.json'
+)
+
+
+class Command(BaseCommand):
+    help = (
+        'Benchmark the HOS planner on canned routes of several lengths and '
+        'cycle hours used, and fail when a case got slower or allocates more '
+        'than the stored baseline allows. Times are compared as ratios to a '
+        'calibration loop run alongside, so a baseline saved on one machine '
+        'holds on another.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--cases',
+            type=parse_case,
+            nargs='+',
+            default=BENCHMARK_CASES,
+            help='Trips benchmarked, as MILES@CYCLE, e.g. 3000@10 (default: '
+            + ' '.join(f'{miles}@{cycle}' for miles, cycle in BENCHMARK_CASES)
+            + ').',
+        )
+        parser.add_argument(
+            '--repeat',
+            type=int,
+            default=20,
+            help='Timed plans per case (default: 20).',
+        )
+        parser.add_argument(
+            '--baseline',
+            default=DEFAULT_BASELINE,
+            help='Baseline results file (default: %(default)s).',
+        )
+        parser.add_argument(
+            '--threshold',
+            type=float,
+            default=settings.PLANNER_BENCHMARK_THRESHOLD,
+            help='Tolerated increase over the baseline, as a fraction '
+            '(default: %(default)s).',
+        )
+        parser.add_argument(
+            '--save-baseline',
+            action='store_true',
+            help='Store these results as the new baseline.',
+        )
+
+    def handle(self, *args, **options):
+        if options['repeat'] < 1:
+            raise CommandError('--repeat must be at least 1.')
+
+        results = run_benchmarks(cases=options['cases'], repeat=options['repeat'])
+
+        self.stdout.write(
+            f'{"case":<16} {"best ms":>9} {"median ms":>10} {"ratio":>7} '
+            f'{"peak KiB":>9}  outcome'
+        )
+        for name, result in results.items():
+            self.stdout.write(
+                f'{name:<16} {result["best_ms"]:>9.2f} {result["median_ms"]:>10.2f} '
+                f'{result["best_ratio"]:>7.3f} {result["peak_kib"]:>9.1f}  '
+                f'{result["outcome"]}'
+            )
+
+        baseline_path = Path(options['baseline'])
+
+        if options['save_baseline']:
+            baseline_path.parent.mkdir(parents=True, exist_ok=True)
+            baseline_path.write_text(json.dumps(results, indent=2) + '\n')
+            self.stdout.write(self.style.SUCCESS(f'Baseline saved to {baseline_path}'))
+            return
+
+        if not baseline_path.exists():
+            raise CommandError(
+                f'No baseline at {baseline_path}, run with --save-baseline.'
+            )
+
+        baseline = json.loads(baseline_path.read_text())
+        missing = [name for name in results if name not in baseline]
+        if missing:
+            self.stdout.write(
+                self.style.WARNING(f'Not in the baseline: {", ".join(missing)}')
+            )
+        regressions = compare_to_baseline(results, baseline, options['threshold'])
+
+        if regressions:
+            for regression in regressions:
+                self.stderr.write(regression)
+
+            raise CommandError(f'{len(regressions)} planner benchmark regressions.')
+
+        self.stdout.write(
+            self.style.SUCCESS(
+                f'No regression over {options["threshold"]:.0%} of the baseline.'
+            )
+        )
@@ -0,0 +1,88 @@
+import json
+
+from django.conf import settings
+from django.db.models import Q
+from django.core.management.base import BaseCommand
+
+from apps.trip.utils.geo_utils import simplify_route, decode_polyline, encode_polyline
+from apps.trip.models.trip_models import Trip
+
+
+class Command(BaseCommand):
+    help = (
+        'Move the GeoJSON route_data of existing trips into the compact '
+        'route_geometry polyline and build their simplified route_levels, '
+        'in chunks.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--batch-size',
+            type=int,
+            default=500,
+            help='Number of trips converted per query (default: 500).',
+        )
+
+    def _get_coordinates(self, trip):
+        if trip.route_geometry:
+            return decode_polyline(trip.route_geometry)
+
+        # Stored as a JSON string inside the JSON field
+        route_data = trip.route_data
+        if isinstance(route_data, str):
+            route_data = json.loads(route_data)
+
+        return route_data['coordinates']
+
+    def handle(self, *args, **options):
+        batch_size = options['batch_size']
+        queryset = (
+            Trip.objects.filter(
+                # Not compacted yet, or compacted before the levels were stored
+                (Q(route_geometry='') & ~Q(route_data={}))
+                | (Q(route_levels={}) & ~Q(route_geometry=''))
+            )
+            .only('id', 'route_data', 'route_geometry', 'route_levels')
+            .order_by('id')
+        )
+
+        converted = failed = 0
+        last_id = None
+
+        while True:
+            chunk = queryset if last_id is None else queryset.filter(id__gt=last_id)
+            trips = list(chunk[:batch_size])
+            if not trips:
+                break
+
+            last_id = trips[-1].id
+            compacted = []
+
+            for trip in trips:
+                try:
+                    coordinates = self._get_coordinates(trip)
+                    trip.route_geometry = trip.route_geometry or encode_polyline(
+                        coordinates
+                    )
+                except (ValueError, TypeError, KeyError) as e:
+                    failed += 1
+                    self.stderr.write(f'Trip {trip.id}: cannot read route_data ({e})')
+                    continue
+
+                trip.route_levels = simplify_route(
+                    coordinates, settings.ROUTE_SIMPLIFY_TOLERANCES
+                )
+                trip.route_data = {}
+                compacted.append(trip)
+
+            # bulk_update leaves updated_at untouched
+            Trip.objects.bulk_update(
+                compacted, ['route_geometry', 'route_data', 'route_levels']
+            )
+            converted += len(compacted)
+
+            self.stdout.write(f'{converted} trips compacted')
+
+        self.stdout.write(
+            self.style.SUCCESS(f'Done: {converted} trips compacted, {failed} failed.')
+        )
@@ -0,0 +1,203 @@
+import os
+import sys
+import json
+import time
+import shlex
+import socket
+import threading
+import subprocess
+
+from pathlib import Path
+
+import requests
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand, CommandError
+
+from apps.trip.utils.loadtest_utils import ENDPOINTS, DEFAULT_MIX, run_load, parse_mix
+from apps.trip.utils.ors_standin_utils import build_standin_server
+
+
+MANAGE_PY = Path(__file__).resolve().parents[4] / 'manage.py'
+
+DEFAULT_SERVER_COMMAND = (
+    f'{shlex.quote(sys.executable)} {shlex.quote(str(MANAGE_PY))} '
+    'runserver {host}:{port} --noreload'
+)
+
+SERVER_START_TIMEOUT = 60
+
+
+def get_free_port(host):
+    with socket.socket() as sock:
+        sock.bind((host, 0))
+        return sock.getsockname()[1]
+
+
+class Command(BaseCommand):
+    help = (
+        'Load test the trips API over HTTP with a mix of calculate, list, '
+        'summary, delete and login requests, and report the throughput and '
+        'latency percentiles of each. By default the app is started with '
+        'ORS_BASE_URL pointing at an in-process ORS stand-in, on the database '
+        'of the current settings: SQLite, or Postgres with DB_URL.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--url',
+            help='Load test a running app instead of starting one; its ORS '
+            'must be stubbed separately, e.g. with `manage.py serve_ors`.',
+        )
+        parser.add_argument(
+            '--server-command',
+            default=DEFAULT_SERVER_COMMAND,
+            help='Command starting the app, with {host} and {port} placeholders, '
+            "e.g. 'gunicorn api.wsgi -w 4 -b {host}:{port}' (default: runserver).",
+        )
+        parser.add_argument(
+            '--users',
+            type=int,
+            default=10,
+            help='Concurrent virtual users, each with its own account (default: 10).',
+        )
+        parser.add_argument(
+            '--duration',
+            type=float,
+            default=30,
+            help='Seconds the load runs for (default: 30).',
+        )
+        parser.add_argument(
+            '--mix',
+            type=parse_mix,
+            default=DEFAULT_MIX,
+            help='Weights of the requests, e.g. '
+            + ','.join(f'{name}={weight}' for name, weight in DEFAULT_MIX.items())
+            + f' (endpoints: {", ".join(ENDPOINTS)}).',
+        )
+        parser.add_argument(
+            '--password',
+            default='loadtest-password',
+            help='Password of the load test accounts, created when missing.',
+        )
+        parser.add_argument(
+            '--ors-latency',
+            type=float,
+            default=0.2,
+            help='Seconds the ORS stand-in takes per route (default: 0.2).',
+        )
+        parser.add_argument(
+            '--seed',
+            type=int,
+            default=0,
+            help='Seed of the random request mix (default: 0).',
+        )
+        parser.add_argument(
+            '--json',
+            help='Also write the report to this file.',
+        )
+
+    def _get_users(self, count, password):
+        """`(username, password)` of the load test accounts, in the database."""
+        User = get_user_model()
+        users = []
+
+        for index in range(count):
+            username = f'loadtest-{index}'
+            user, created = User.objects.get_or_create(
+                username=username, defaults={'email': f'{username}@example.com'}
+            )
+            if created or not user.check_password(password):
+                user.set_password(password)
+                user.save(update_fields=['password'])
+
+            users.append((username, password))
+
+        return users
+
+    def _start_server(self, command, env, base_url):
+        process = subprocess.Popen(shlex.split(command), env=env)
+        deadline = time.monotonic() + SERVER_START_TIMEOUT
+
+        while time.monotonic() < deadline:
+            if process.poll() is not None:
+                raise CommandError(f'The app exited with status {process.returncode}.')
+
+            try:
+                requests.get(base_url, timeout=1)
+                return process
+            except requests.RequestException:
+                time.sleep(0.25)
+
+        process.terminate()
+        raise CommandError(f'The app did not answer within {SERVER_START_TIMEOUT}s.')
+
+    def _write_report(self, report, users, duration):
+        self.stdout.write(
+            f'{users} users for {duration:g}s\n'
+            f'{"endpoint":<10} {"requests":>8} {"errors":>6} {"429":>5} '
+            f'{"req/s":>8} {"p50 ms":>8} {"p95 ms":>8} {"p99 ms":>8} {"max ms":>8}'
+        )
+        for endpoint, stats in report.items():
+            self.stdout.write(
+                f'{endpoint:<10} {stats["requests"]:>8} {stats["errors"]:>6} '
+                f'{stats["throttled"]:>5} {stats["throughput"]:>8.2f} '
+                f'{stats["p50_ms"]:>8.1f} {stats["p95_ms"]:>8.1f} '
+                f'{stats["p99_ms"]:>8.1f} {stats["max_ms"]:>8.1f}'
+            )
+
+    def handle(self, *args, **options):
+        if options['users'] < 1 or options['duration'] <= 0:
+            raise CommandError('--users and --duration must be positive.')
+
+        users = self._get_users(options['users'], options['password'])
+
+        ors_server = process = None
+        base_url = options['url']
+
+        try:
+            if base_url is None:
+                host = '127.0.0.1'
+                ors_server = build_standin_server(
+                    host=host, port=0, latency=options['ors_latency']
+                )
+                threading.Thread(target=ors_server.serve_forever, daemon=True).start()
+                ors_url = 'http://{}:{}'.format(*ors_server.server_address[:2])
+
+                port = get_free_port(host)
+                base_url = f'http://{host}:{port}'
+                env = {
+                    **os.environ,
+                    'DJANGO_SETTINGS_MODULE': settings.SETTINGS_MODULE,
+                    'ORS_BASE_URL': ors_url,
+                }
+                process = self._start_server(
+                    options['server_command'].format(host=host, port=port),
+                    env,
+                    base_url,
+                )
+
+            report = run_load(
+                base_url,
+                users,
+                options['mix'],
+                options['duration'],
+                seed=options['seed'],
+            )
+
+        finally:
+            if process is not None:
+                process.terminate()
+                process.wait()
+            if ors_server is not None:
+                ors_server.shutdown()
+                ors_server.server_close()
+
+        if not report:
+            raise CommandError(f'No request completed against {base_url}.')
+
+        self._write_report(report, options['users'], options['duration'])
+
+        if options['json']:
+            Path(options['json']).write_text(json.dumps(report, indent=2) + '\n')
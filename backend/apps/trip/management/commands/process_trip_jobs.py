@@ -0,0 +1,84 @@
+import time
+
+from django.db import close_old_connections
+from django.core.management.base import BaseCommand
+
+from apps.trip.utils.job_utils import (
+    run_trip_jobs,
+    claim_trip_jobs,
+    requeue_stale_jobs,
+)
+from apps.trip.models.trip_job_models import TripJobStatus
+
+
+class Command(BaseCommand):
+    help = (
+        'Process queued trip calculations. Runs until interrupted, polling the '
+        'queue when it is empty, or drains it once with --once.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--batch-size',
+            type=int,
+            default=10,
+            help='Number of jobs calculated together (default: 10).',
+        )
+        parser.add_argument(
+            '--poll-interval',
+            type=float,
+            default=1.0,
+            help='Seconds to wait when the queue is empty (default: 1).',
+        )
+        parser.add_argument(
+            '--stale-after',
+            type=int,
+            default=600,
+            help='Seconds after which a running job is requeued (default: 600).',
+        )
+        parser.add_argument(
+            '--max-attempts',
+            type=int,
+            default=3,
+            help='Attempts before a stale job is marked failed (default: 3).',
+        )
+        parser.add_argument(
+            '--once',
+            action='store_true',
+            help='Exit once the queue is empty.',
+        )
+
+    def handle(self, *args, **options):
+        processed = 0
+
+        try:
+            while True:
+                close_old_connections()
+
+                requeued, failed = requeue_stale_jobs(
+                    options['stale_after'], options['max_attempts']
+                )
+                if requeued or failed:
+                    self.stderr.write(
+                        f'{requeued} stale jobs requeued, {failed} marked failed'
+                    )
+
+                jobs = claim_trip_jobs(options['batch_size'])
+                if not jobs:
+                    if options['once']:
+                        break
+
+                    time.sleep(options['poll_interval'])
+                    continue
+
+                for job in run_trip_jobs(jobs):
+                    processed += 1
+                    if job.status == TripJobStatus.FAILED:
+                        self.stderr.write(f'Job {job.id}: {job.error["detail"]}')
+
+                self.stdout.write(f'{processed} jobs processed')
+
+        except KeyboardInterrupt:
+            pass
+
+        self.stdout.write(self.style.SUCCESS(f'Done: {processed} jobs processed.'))
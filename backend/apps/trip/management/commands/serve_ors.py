@@ -0,0 +1,104 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from apps.trip.utils.ors_standin_utils import (
+    MODES,
+    RECORD,
+    REPLAY,
+    SYNTHESIZE,
+    build_standin_server,
+)
+
+
+class Command(BaseCommand):
+    help = (
+        'Serve a local stand-in for the ORS directions API, to point '
+        'ORS_BASE_URL at during load tests, benchmarks and CI. It synthesizes '
+        'routes, replays recorded responses, or records responses of the real '
+        'API to fixtures.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--host',
+            default='127.0.0.1',
+            help='Interface to listen on (default: 127.0.0.1).',
+        )
+        parser.add_argument(
+            '--port',
+            type=int,
+            default=8080,
+            help='Port to listen on (default: 8080).',
+        )
+        parser.add_argument(
+            '--mode',
+            choices=MODES,
+            default=SYNTHESIZE,
+            help=f'How requests are answered (default: {SYNTHESIZE}).',
+        )
+        parser.add_argument(
+            '--fixtures',
+            help=f'Directory of the recorded responses, for {REPLAY} and {RECORD}.',
+        )
+        parser.add_argument(
+            '--upstream',
+            default='https://api.openrouteservice.org',
+            help=f'API the {RECORD} mode forwards requests to.',
+        )
+        parser.add_argument(
+            '--miles',
+            type=float,
+            help='Total length of every synthesized route, in miles.',
+        )
+        parser.add_argument(
+            '--latency',
+            type=float,
+            default=0,
+            help='Seconds added to every response (default: 0).',
+        )
+        parser.add_argument(
+            '--error-rate',
+            type=float,
+            default=0,
+            help='Fraction of the requests failing with a 503 (default: 0).',
+        )
+        parser.add_argument(
+            '--synthesize-missing',
+            action='store_true',
+            help=f'In {REPLAY} mode, synthesize the routes never recorded.',
+        )
+
+    def handle(self, *args, **options):
+        try:
+            server = build_standin_server(
+                host=options['host'],
+                port=options['port'],
+                mode=options['mode'],
+                fixtures_dir=options['fixtures'],
+                upstream=options['upstream'],
+                miles=options['miles'],
+                latency=options['latency'],
+                error_rate=options['error_rate'],
+                synthesize_missing=options['synthesize_missing'],
+            )
+        except (ValueError, OSError) as e:
+            raise CommandError(e)
+
+        host, port = server.server_address[:2]
+        self.stdout.write(
+            self.style.SUCCESS(
+                f'ORS stand-in ({options["mode"]}) on http://{host}:{port}, '
+                f'set ORS_BASE_URL to it. Quit with CONTROL-C.'
+            )
+        )
+        # Synthetic routes also land in the route cache of the app using them
+        self.stdout.write(
+            'Run the app with ROUTE_CACHE_ENABLED=false to keep them out of '
+            'the route cache.'
+        )
+
+        try:
+            server.serve_forever()
+        except KeyboardInterrupt:
+            pass
+        finally:
+            server.server_close()
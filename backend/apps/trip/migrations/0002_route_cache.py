@@ -0,0 +1,44 @@
+# Generated by Django 5.2.7 on 2026-10-18 07:06
+
+import django.db.models.deletion
+import uuid
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('trip', '0001_initial'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AlterModelOptions(
+            name='triplog',
+            options={'ordering': ['log_date', 'created_at']},
+        ),
+        migrations.CreateModel(
+            name='RouteCache',
+            fields=[
+                ('id', models.UUIDField(default=uuid.uuid4, editable=False, primary_key=True, serialize=False, unique=True)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+                ('cache_key', models.CharField(max_length=255, unique=True)),
+                ('profile', models.CharField(max_length=50)),
+                ('start_coordinates', models.CharField(max_length=255)),
+                ('end_coordinates', models.CharField(max_length=255)),
+                ('distance_meters', models.FloatField()),
+                ('duration_seconds', models.FloatField()),
+                ('geometry', models.TextField()),
+                ('segments', models.JSONField(default=list)),
+                ('hit_count', models.PositiveIntegerField(default=0)),
+                ('last_used_at', models.DateTimeField(db_index=True)),
+                ('created_by', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='%(class)s_created_by_related', to=settings.AUTH_USER_MODEL)),
+                ('updated_by', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='%(class)s_updated_by_related', to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'ordering': ['-last_used_at'],
+            },
+        ),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 5.2.7 on 2026-10-18 07:20
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('trip', '0003_trip_created_at_id_idx'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='trip',
+            name='timeline',
+            field=models.JSONField(blank=True, null=True),
+        ),
+    ]
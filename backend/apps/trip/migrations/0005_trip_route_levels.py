@@ -0,0 +1,18 @@
+# Generated by Django 5.2.7 on 2026-10-18 07:21
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('trip', '0004_trip_timeline'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='trip',
+            name='route_levels',
+            field=models.JSONField(blank=True, default=dict),
+        ),
+    ]
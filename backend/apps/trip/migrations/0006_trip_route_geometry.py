@@ -0,0 +1,23 @@
+# Generated by Django 5.2.7 on 2026-10-18 07:22
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('trip', '0005_trip_route_levels'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='trip',
+            name='route_geometry',
+            field=models.TextField(blank=True, default=''),
+        ),
+        migrations.AlterField(
+            model_name='trip',
+            name='route_data',
+            field=models.JSONField(blank=True, default=dict),
+        ),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 5.2.7 on 2026-10-18 07:35
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('trip', '0007_trip_job'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='trip',
+            name='stale_route',
+            field=models.BooleanField(default=False),
+        ),
+    ]
@@ -1,3 +1,5 @@
 from .trip_models import *
+from .trip_job_models import *
 from .trip_log_models import *
 from .trip_route_models import *
+from .route_cache_models import *
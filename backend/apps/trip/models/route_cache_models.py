@@ -0,0 +1,22 @@
+from django.db import models
+
+from api.models.base_model import BaseModelMixin
+
+
+class RouteCache(BaseModelMixin):
+    cache_key = models.CharField(max_length=255, unique=True)
+    profile = models.CharField(max_length=50)
+    start_coordinates = models.CharField(max_length=255)
+    end_coordinates = models.CharField(max_length=255)
+    distance_meters = models.FloatField()
+    duration_seconds = models.FloatField()
+    geometry = models.TextField()
+    segments = models.JSONField(default=list)
+    hit_count = models.PositiveIntegerField(default=0)
+    last_used_at = models.DateTimeField(db_index=True)
+
+    class Meta:
+        ordering = ['-last_used_at']
+
+    def __str__(self):
+        return f'Route {self.start_coordinates} -> {self.end_coordinates}'
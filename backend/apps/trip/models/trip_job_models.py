@@ -0,0 +1,46 @@
+from django.db import models
+from django.utils.translation import gettext as _
+
+from api.models.base_model import BaseModelMixin
+
+from .trip_models import Trip
+
+
+class TripJobStatus(models.TextChoices):
+    PENDING = 'pending', _('Pending')
+    RUNNING = 'running', _('Running')
+    SUCCEEDED = 'succeeded', _('Succeeded')
+    FAILED = 'failed', _('Failed')
+
+
+class TripJob(BaseModelMixin):
+    """A queued trip calculation, processed by `process_trip_jobs`."""
+
+    status = models.CharField(
+        max_length=10,
+        choices=TripJobStatus.choices,
+        default=TripJobStatus.PENDING,
+    )
+    # Validated `calculate` input, as passed to the trip calculation
+    payload = models.JSONField()
+    trip = models.ForeignKey(
+        Trip,
+        related_name='jobs',
+        on_delete=models.SET_NULL,
+        null=True,
+        blank=True,
+    )
+    # Error result of a failed calculation, `error` and `detail`
+    error = models.JSONField(null=True, blank=True)
+    attempts = models.PositiveSmallIntegerField(default=0)
+    started_at = models.DateTimeField(null=True, blank=True)
+    finished_at = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        indexes = [
+            # Workers claim the oldest pending jobs first
+            models.Index(fields=['status', 'created_at'], name='trip_job_queue_idx'),
+        ]
+
+    def __str__(self):
+        return f'Trip job {self.id} ({self.status})'
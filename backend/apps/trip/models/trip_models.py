@@ -1,7 +1,11 @@
-from django.db import models
+from django.db import models, transaction
+from django.dispatch import receiver
+from django.db.models.signals import post_save, post_delete
 
 from api.models.base_model import BaseModelMixin
 
+from apps.trip.utils.response_cache_utils import bump_trips_version
+
 
 class Trip(BaseModelMixin):
     current_location = models.CharField(max_length=255)
@@ -11,7 +15,12 @@ class Trip(BaseModelMixin):
     dropoff_location = models.CharField(max_length=255)
     dropoff_coordinates = models.CharField(max_length=255)
     current_cycle_used = models.DecimalField(max_digits=4, decimal_places=2)
-    route_data = models.JSONField(default=dict)
+    # Legacy GeoJSON string, moved to route_geometry by `compact_route_data`
+    route_data = models.JSONField(default=dict, blank=True)
+    # Full route geometry as an encoded polyline
+    route_geometry = models.TextField(blank=True, default='')
+    # Simplified route polylines keyed on their tolerance in degrees
+    route_levels = models.JSONField(default=dict, blank=True)
     total_trip_miles = models.DecimalField(
         max_digits=7,
         decimal_places=2,
@@ -24,6 +33,22 @@ class Trip(BaseModelMixin):
         null=True,
         blank=True,
     )
+    # Duty-status timeline computed with the plan, rows of TIMELINE_FIELDS
+    timeline = models.JSONField(null=True, blank=True)
+    # Planned on expired cached routes while ORS was unavailable
+    stale_route = models.BooleanField(default=False)
+
+    class Meta:
+        indexes = [
+            # Keyset pagination of the trip list
+            models.Index(fields=['-created_at', '-id'], name='trip_created_at_id_idx'),
+        ]
 
     def __str__(self):
         return f'Trip from {self.pickup_location} to {self.dropoff_location}'
+
+
+@receiver(post_save, sender=Trip)
+@receiver(post_delete, sender=Trip)
+def invalidate_trip_responses(sender, instance, **kwargs):
+    transaction.on_commit(bump_trips_version)
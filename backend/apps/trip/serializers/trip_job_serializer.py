@@ -0,0 +1,24 @@
+from rest_framework import serializers
+
+from apps.trip.models.trip_job_models import TripJob
+from apps.trip.serializers.trip_serializer import TripSerializer
+
+
+class TripJobSerializer(serializers.ModelSerializer):
+    """State of a queued calculation, with the trip once it succeeded."""
+
+    trip = TripSerializer(read_only=True)
+
+    class Meta:
+        model = TripJob
+        fields = [
+            'id',
+            'status',
+            'attempts',
+            'error',
+            'trip',
+            'created_at',
+            'started_at',
+            'finished_at',
+        ]
+        read_only_fields = fields
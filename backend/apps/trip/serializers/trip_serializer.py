@@ -5,9 +5,9 @@ from apps.trip.serializers.trip_log_serializer import TripLogSerializer
 from apps.trip.serializers.trip_route_serializer import TripRouteSerializer
 
 
-class TripSerializer(serializers.ModelSerializer):
-    daily_logs = TripLogSerializer(many=True, read_only=True)
-    trip_routes = TripRouteSerializer(many=True, read_only=True)
+class TripListSerializer(serializers.ModelSerializer):
+    """Summary fields of a trip, without its stops and daily logs."""
+
     trip_name = serializers.SerializerMethodField()
 
     class Meta:
@@ -24,15 +24,16 @@ class TripSerializer(serializers.ModelSerializer):
             'current_cycle_used',
             'total_trip_miles',
             'total_driving_hrs',
+            'stale_route',
             'created_at',
-            'daily_logs',
-            'trip_routes',
         ]
 
         read_only_fields = [
             'total_trip_miles',
             'total_driving_hrs',
             'route_data',
+            'route_geometry',
+            'stale_route',
         ]
 
     def get_trip_name(self, obj):
@@ -49,3 +50,14 @@ class TripSerializer(serializers.ModelSerializer):
         dropoff_loc = get_location_name(obj.dropoff_location)
 
         return f'{current_loc} - {pickup_loc} - {dropoff_loc}'
+
+
+class TripSerializer(TripListSerializer):
+    daily_logs = TripLogSerializer(many=True, read_only=True)
+    trip_routes = TripRouteSerializer(many=True, read_only=True)
+
+    class Meta(TripListSerializer.Meta):
+        fields = TripListSerializer.Meta.fields + [
+            'daily_logs',
+            'trip_routes',
+        ]
@@ -1 +1,933 @@
-# Create your tests here.
+import json
+import time
+import threading
+
+from io import StringIO
+from decimal import Decimal
+from datetime import timedelta
+from unittest import mock
+from itertools import pairwise
+from http.server import HTTPServer, BaseHTTPRequestHandler
+from concurrent.futures import ThreadPoolExecutor
+
+import requests
+
+from django.db import connection, close_old_connections
+from django.conf import settings
+from django.test import TestCase, TransactionTestCase, override_settings
+from asgiref.sync import async_to_sync
+from django.utils import timezone
+from django.core.cache import cache
+from django.test.utils import CaptureQueriesContext
+from django.contrib.auth import get_user_model
+from rest_framework.test import APIClient, APIRequestFactory, force_authenticate
+from django.core.management import call_command
+from rest_framework.throttling import UserRateThrottle
+from openrouteservice.exceptions import ApiError
+
+from apps.trip.utils import ors_utils
+from apps.trip.models import Trip, TripLog, TripRoute, RouteCache
+from apps.trip.utils.geo_utils import (
+    RouteIndex,
+    simplify_route,
+    decode_polyline,
+    encode_polyline,
+)
+from apps.trip.utils.job_utils import (
+    claim_trip_jobs,
+    enqueue_trip_job,
+    requeue_stale_jobs,
+)
+from apps.trip.views.trip_view import TripCalculateAsyncView
+from apps.trip.utils.trip_utils import (
+    ELDTripPlanner,
+    persist_trip_plan,
+    run_trip_calculation,
+)
+from apps.trip.models.trip_job_models import TripJob, TripJobStatus
+from apps.trip.utils.ors_standin_utils import haversine_meters, synthesize_directions
+from apps.trip.utils.route_cache_utils import (
+    RouteCacheStore,
+    route_cache,
+    make_cache_key,
+)
+from apps.trip.utils.circuit_breaker_utils import CircuitBreaker
+
+
+def synthetic_route(start_coords, end_coords, distance_miles):
+    """A straight-line route payload shaped like `get_ors_route` output."""
+    distance_miles = Decimal(distance_miles)
+
+    return {
+        'distance_miles': distance_miles,
+        'duration_hours': distance_miles / Decimal('55.0'),
+        'geometry': encode_polyline([start_coords, end_coords]),
+        'segments': [],
+    }
+
+
+def synthetic_plan(leg_miles):
+    """Plan a trip whose two legs are both `leg_miles` long."""
+    planner = ELDTripPlanner(lambda start, end: synthetic_route(start, end, leg_miles))
+    plan = planner.create_trip_plan(
+        current_coords=(-74.006, 40.7128),
+        pickup_coords=(-87.6298, 41.8781),
+        dropoff_coords=(-118.2437, 34.0522),
+        current_cycle_used=Decimal('0'),
+        current_location='New York, NY',
+        pickup_location='Chicago, IL',
+        dropoff_location='Los Angeles, CA',
+    )
+    plan['trip'] = {
+        'current_location': 'New York, NY',
+        'current_coordinates': '40.7128,-74.006',
+        'pickup_location': 'Chicago, IL',
+        'pickup_coordinates': '41.8781,-87.6298',
+        'dropoff_location': 'Los Angeles, CA',
+        'dropoff_coordinates': '34.0522,-118.2437',
+        'current_cycle_used': Decimal('0'),
+        'route_geometry': plan['trip_data']['route_geometry'],
+        'total_trip_miles': plan['trip_data']['total_trip_miles'],
+        'total_driving_hrs': plan['trip_data']['total_driving_hrs'],
+    }
+
+    return plan
+
+
+class PersistTripPlanTest(TestCase):
+    def test_query_count_does_not_grow_with_trip_length(self):
+        short_plan = synthetic_plan(50)
+        long_plan = synthetic_plan(1800)
+        self.assertGreater(
+            len(long_plan['trip_routes']), len(short_plan['trip_routes']) * 5
+        )
+
+        # SAVEPOINT, trip insert, stops insert, logs insert, RELEASE
+        with self.assertNumQueries(5):
+            persist_trip_plan(short_plan)
+
+        with self.assertNumQueries(5):
+            trip = persist_trip_plan(long_plan)
+
+        self.assertEqual(Trip.objects.count(), 2)
+        self.assertEqual(
+            TripRoute.objects.filter(trip=trip).count(), len(long_plan['trip_routes'])
+        )
+        self.assertEqual(
+            TripLog.objects.filter(trip=trip).count(), len(long_plan['daily_logs'])
+        )
+
+
+class CompactRouteDataTest(TestCase):
+    def test_backfill_builds_the_geometry_and_its_levels(self):
+        coordinates = [[-74.006, 40.7128], [-80.0, 41.0], [-87.6298, 41.8781]]
+        legacy = persist_trip_plan(synthetic_plan(300))
+        compacted = persist_trip_plan(synthetic_plan(300))
+        Trip.objects.filter(id=legacy.id).update(
+            route_data=json.dumps({'type': 'LineString', 'coordinates': coordinates}),
+            route_geometry='',
+            route_levels={},
+        )
+        Trip.objects.filter(id=compacted.id).update(route_levels={})
+
+        call_command('compact_route_data', stdout=StringIO(), stderr=StringIO())
+
+        legacy.refresh_from_db()
+        compacted.refresh_from_db()
+        self.assertEqual(legacy.route_data, {})
+        self.assertEqual(legacy.route_geometry, encode_polyline(coordinates))
+        for trip in (legacy, compacted):
+            self.assertEqual(
+                trip.route_levels,
+                simplify_route(
+                    decode_polyline(trip.route_geometry),
+                    settings.ROUTE_SIMPLIFY_TOLERANCES,
+                ),
+            )
+            self.assertEqual(
+                len(trip.route_levels), len(settings.ROUTE_SIMPLIFY_TOLERANCES)
+            )
+
+
+def linear_locate(coordinates, fraction):
+    """Point at `fraction` of a polyline, walking its edges one by one."""
+    edges = [haversine_meters(start, end) for start, end in pairwise(coordinates)]
+    target = fraction * sum(edges)
+
+    for (start, end), edge in zip(pairwise(coordinates), edges):
+        if target <= edge and edge:
+            ratio = target / edge
+            return tuple(a + ratio * (b - a) for a, b in zip(start, end))
+
+        target -= edge
+
+    return tuple(coordinates[-1])
+
+
+class RouteIndexTest(TestCase):
+    def test_locates_the_same_points_as_a_linear_scan(self):
+        route = synthesize_directions(
+            [[-74.006, 40.7128], [-87.6298, 41.8781], [-118.2437, 34.0522]]
+        )['routes'][0]
+        coordinates = decode_polyline(route['geometry'])
+        index = RouteIndex(coordinates)
+
+        # Between points, on a waypoint and at both ends
+        way_point = route['way_points'][1] / (len(coordinates) - 1)
+        for fraction in (0, 0.001, 0.1, 0.37, way_point, 0.5, 0.999, 1):
+            with self.subTest(fraction=fraction):
+                lon, lat = index.locate_fraction(fraction)
+                expected_lon, expected_lat = linear_locate(coordinates, fraction)
+
+                self.assertAlmostEqual(lon, expected_lon, places=6)
+                self.assertAlmostEqual(lat, expected_lat, places=6)
+
+
+class TripListQueryCountTest(TestCase):
+    url = '/api/trips/?size=100'
+
+    def setUp(self):
+        cache.clear()
+        self.client = APIClient()
+
+    def create_trips(self, count):
+        # Run the on-commit invalidation of the cached responses
+        with self.captureOnCommitCallbacks(execute=True):
+            for _ in range(count):
+                persist_trip_plan(synthetic_plan(1800))
+
+    def test_list_is_lean_and_does_not_grow_with_page_size(self):
+        self.create_trips(2)
+        # COUNT, page of trips
+        with self.assertNumQueries(2):
+            response = self.client.get(self.url)
+
+        self.create_trips(8)
+        with self.assertNumQueries(2):
+            response = self.client.get(self.url)
+
+        self.assertEqual(len(response.data['results']), 10)
+        self.assertNotIn('trip_routes', response.data['results'][0])
+        self.assertNotIn('daily_logs', response.data['results'][0])
+
+    def test_nested_list_prefetches_stops_and_logs(self):
+        self.create_trips(2)
+        # COUNT, page of trips, daily logs, stops
+        with self.assertNumQueries(4):
+            self.client.get(self.url + '&nested=true')
+
+        self.create_trips(8)
+        with self.assertNumQueries(4):
+            response = self.client.get(self.url + '&nested=true')
+
+        trip = response.data['results'][0]
+        self.assertEqual(len(response.data['results']), 10)
+        self.assertEqual(
+            len(trip['trip_routes']), TripRoute.objects.filter(trip=trip['id']).count()
+        )
+
+
+class TripKeysetPaginationTest(TestCase):
+    url = '/api/trips/?pagination=cursor&size=2'
+
+    def setUp(self):
+        cache.clear()
+        self.client = APIClient()
+        with self.captureOnCommitCallbacks(execute=True):
+            for _ in range(5):
+                persist_trip_plan(synthetic_plan(50))
+
+    def get_ids(self, response):
+        return [trip['id'] for trip in response.data['results']]
+
+    def test_next_and_previous_cursors_round_trip(self):
+        newest_first = [
+            str(pk)
+            for pk in Trip.objects.order_by('-created_at', '-id').values_list(
+                'id', flat=True
+            )
+        ]
+
+        first = self.client.get(self.url)
+        self.assertEqual(self.get_ids(first), newest_first[:2])
+        self.assertIsNone(first.data['previous'])
+        self.assertIsNone(first.data['count'])
+
+        second = self.client.get(first.data['next'])
+        self.assertEqual(self.get_ids(second), newest_first[2:4])
+
+        last = self.client.get(second.data['next'])
+        self.assertEqual(self.get_ids(last), newest_first[4:])
+        self.assertIsNone(last.data['next'])
+
+        back = self.client.get(second.data['previous'])
+        self.assertEqual(self.get_ids(back), newest_first[:2])
+        self.assertIsNone(back.data['previous'])
+        self.assertEqual(
+            self.get_ids(self.client.get(back.data['next'])), newest_first[2:4]
+        )
+
+    def test_invalid_cursor_is_not_found(self):
+        # Not base64, and base64 of `x|y|z`
+        for cursor in ('not-a-cursor', 'eHx5fHo='):
+            with self.subTest(cursor=cursor):
+                response = self.client.get(f'/api/trips/?cursor={cursor}')
+
+                self.assertEqual(response.status_code, 404)
+                self.assertEqual(
+                    response.data['errors'][0]['message'], 'Invalid cursor'
+                )
+
+
+class TripResponseCacheTest(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.client = APIClient()
+        with self.captureOnCommitCallbacks(execute=True):
+            self.trip = persist_trip_plan(synthetic_plan(300))
+
+    def test_list_is_cached_until_a_trip_is_created(self):
+        url = '/api/trips/?size=100'
+        self.client.get(url)
+        with self.assertNumQueries(0):
+            response = self.client.get(url)
+        self.assertEqual(len(response.data['results']), 1)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            persist_trip_plan(synthetic_plan(300))
+
+        response = self.client.get(url)
+        self.assertEqual(len(response.data['results']), 2)
+
+    def test_summary_is_cached_until_the_trip_is_deleted(self):
+        url = f'/api/trips/{self.trip.id}/summary/'
+        etag = self.client.get(url)['ETag']
+        with self.assertNumQueries(0):
+            response = self.client.get(url)
+            not_modified = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(not_modified.status_code, 304)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.trip.delete()
+
+        self.assertEqual(self.client.get(url).status_code, 404)
+
+    def test_summary_nests_stops_and_logs_unless_lean(self):
+        url = f'/api/trips/{self.trip.id}/summary/'
+
+        data = self.client.get(url).data['data']
+        lean = self.client.get(url + '?lean=true').data['data']
+
+        self.assertEqual(len(data['daily_logs']), self.trip.daily_logs.count())
+        self.assertEqual(len(data['trip_routes']), self.trip.trip_routes.count())
+        self.assertNotIn('daily_logs', lean)
+        self.assertNotIn('trip_routes', lean)
+        self.assertEqual(lean['timeline'], data['timeline'])
+
+
+class TripETagTest(TestCase):
+    def setUp(self):
+        self.client = APIClient()
+        self.trip = persist_trip_plan(synthetic_plan(300))
+        self.url = f'/api/trips/{self.trip.id}/'
+
+    def test_matching_etag_is_not_modified(self):
+        response = self.client.get(self.url)
+        etag = response['ETag']
+        self.assertEqual(response.status_code, 200)
+
+        # Answered from `updated_at` alone, without loading the trip
+        with self.assertNumQueries(1):
+            response = self.client.get(self.url, HTTP_IF_NONE_MATCH=etag)
+
+        self.assertEqual(response.status_code, 304)
+        self.assertEqual(response.content, b'')
+        self.assertEqual(response['ETag'], etag)
+
+        response = self.client.get(self.url, HTTP_IF_NONE_MATCH=f'W/{etag}')
+        self.assertEqual(response.status_code, 304)
+
+    def test_etag_changes_when_the_trip_is_updated(self):
+        etag = self.client.get(self.url)['ETag']
+
+        self.trip.total_trip_miles += 1
+        self.trip.save()
+
+        response = self.client.get(self.url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertNotEqual(response['ETag'], etag)
+        self.assertEqual(
+            Decimal(str(response.data['total_trip_miles'])), self.trip.total_trip_miles
+        )
+
+
+TRIP_DATA = {
+    'current_location': 'New York, NY',
+    'current_coordinates': '40.7128,-74.006',
+    'pickup_location': 'Chicago, IL',
+    'pickup_coordinates': '41.8781,-87.6298',
+    'dropoff_location': 'Los Angeles, CA',
+    'dropoff_coordinates': '34.0522,-118.2437',
+    'current_cycle_used_hrs': Decimal('0'),
+}
+
+
+class TripJobQueueTest(TestCase):
+    def setUp(self):
+        self.jobs = [enqueue_trip_job(TRIP_DATA) for _ in range(3)]
+
+    def age_running_jobs(self):
+        TripJob.objects.filter(status=TripJobStatus.RUNNING).update(
+            started_at=timezone.now() - timedelta(hours=1)
+        )
+
+    def test_claim_takes_the_oldest_pending_jobs_once(self):
+        with CaptureQueriesContext(connection) as queries:
+            claimed = claim_trip_jobs(2)
+
+        # SQLite has no row locks, the claim then only relies on its UPDATE
+        if connection.features.has_select_for_update_skip_locked:
+            self.assertTrue(
+                any('SKIP LOCKED' in query['sql'] for query in queries.captured_queries)
+            )
+
+        self.assertEqual([job.id for job in claimed], [job.id for job in self.jobs[:2]])
+        for job in claimed:
+            self.assertEqual(job.status, TripJobStatus.RUNNING)
+            self.assertEqual(job.attempts, 1)
+            self.assertIsNotNone(job.started_at)
+
+        self.assertEqual([job.id for job in claim_trip_jobs(2)], [self.jobs[2].id])
+        self.assertEqual(claim_trip_jobs(2), [])
+
+    def test_stale_jobs_are_requeued_until_their_last_attempt(self):
+        claim_trip_jobs(1)
+        self.assertEqual(requeue_stale_jobs(stale_after=60, max_attempts=2), (0, 0))
+
+        self.age_running_jobs()
+        self.assertEqual(requeue_stale_jobs(stale_after=60, max_attempts=2), (1, 0))
+        self.jobs[0].refresh_from_db()
+        self.assertEqual(self.jobs[0].status, TripJobStatus.PENDING)
+
+        claim_trip_jobs(1)
+        self.age_running_jobs()
+        self.assertEqual(requeue_stale_jobs(stale_after=60, max_attempts=2), (0, 1))
+        self.jobs[0].refresh_from_db()
+        self.assertEqual(self.jobs[0].status, TripJobStatus.FAILED)
+        self.assertEqual(self.jobs[0].attempts, 2)
+
+    @override_settings(TRIP_BATCH_WORKERS=1)
+    @mock.patch.object(
+        ors_utils.ORS_CLIENT,
+        'directions',
+        side_effect=lambda coordinates, **kwargs: synthesize_directions(coordinates),
+    )
+    def test_process_trip_jobs_once_drains_the_queue(self, directions):
+        route_cache.clear()
+        self.addCleanup(route_cache.clear)
+        invalid = enqueue_trip_job({**TRIP_DATA, 'pickup_coordinates': 'nowhere'})
+        stdout = StringIO()
+
+        call_command(
+            'process_trip_jobs',
+            '--once',
+            '--batch-size=2',
+            stdout=stdout,
+            stderr=StringIO(),
+        )
+
+        self.assertIn('Done: 4 jobs processed.', stdout.getvalue())
+        for job in self.jobs:
+            job.refresh_from_db()
+            self.assertEqual(job.status, TripJobStatus.SUCCEEDED)
+            self.assertIsNotNone(job.trip_id)
+
+        invalid.refresh_from_db()
+        self.assertEqual(invalid.status, TripJobStatus.FAILED)
+        self.assertEqual(invalid.error['error'], 'Calculation error')
+        self.assertEqual(Trip.objects.count(), 3)
+
+
+class RateLimitedHandler(BaseHTTPRequestHandler):
+    """ORS stand-in that rate limits every request, asking for a long wait."""
+
+    requests = 0
+
+    def log_message(self, format, *args):
+        pass
+
+    def do_POST(self):
+        type(self).requests += 1
+        self.rfile.read(int(self.headers['Content-Length']))
+
+        self.send_response(429)
+        self.send_header('Retry-After', '120')
+        self.send_header('Content-Type', 'application/json')
+        self.end_headers()
+        self.wfile.write(b'{"error": "Rate limit exceeded"}')
+
+
+@override_settings(ORS_MAX_RETRIES=2, ORS_RETRY_AFTER_MAX=5)
+class ORSRetryTest(TestCase):
+    def setUp(self):
+        RateLimitedHandler.requests = 0
+        self.server = HTTPServer(('127.0.0.1', 0), RateLimitedHandler)
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+        self.addCleanup(self.server.server_close)
+        self.addCleanup(self.server.shutdown)
+
+    @mock.patch('apps.trip.utils.ors_utils.time.sleep')
+    def test_rate_limit_is_retried_a_bounded_number_of_times(self, sleep):
+        host, port = self.server.server_address
+        with override_settings(ORS_BASE_URL=f'http://{host}:{port}'):
+            client = ors_utils.build_ors_client()
+
+        with self.assertRaises(requests.exceptions.RetryError):
+            client.directions(
+                coordinates=[[-74.006, 40.7128], [-87.6298, 41.8781]],
+                profile=ors_utils.ORS_PROFILE,
+            )
+
+        # The first request and two retries, each waiting the capped hint
+        self.assertEqual(RateLimitedHandler.requests, 3)
+        self.assertEqual(sleep.call_args_list, [mock.call(5), mock.call(5)])
+
+
+@override_settings(
+    ORS_BREAKER_MIN_CALLS=2, ORS_BREAKER_FAILURE_RATE=0.5, ORS_BREAKER_RESET_TIMEOUT=30
+)
+class CircuitBreakerTest(TestCase):
+    def test_breaker_opens_half_opens_and_closes(self):
+        breaker = CircuitBreaker('test')
+        for _ in range(2):
+            self.assertTrue(breaker.allow())
+            breaker.record_failure()
+
+        self.assertEqual(breaker.state, CircuitBreaker.OPEN)
+        self.assertFalse(breaker.allow())
+        self.assertGreater(breaker.retry_after(), 0)
+
+        with self.settings(ORS_BREAKER_RESET_TIMEOUT=0):
+            # A single trial call, a failed one opens the breaker again
+            self.assertTrue(breaker.allow())
+            self.assertEqual(breaker.state, CircuitBreaker.HALF_OPEN)
+            self.assertFalse(breaker.allow())
+            breaker.record_failure()
+            self.assertEqual(breaker.state, CircuitBreaker.OPEN)
+
+            self.assertTrue(breaker.allow())
+            breaker.record_success()
+
+        self.assertEqual(breaker.state, CircuitBreaker.CLOSED)
+        self.assertTrue(breaker.allow())
+        self.assertEqual(
+            breaker.stats(),
+            {'state': CircuitBreaker.CLOSED, 'failures': 3, 'rejected': 2, 'opened': 2},
+        )
+
+
+@override_settings(
+    ROUTE_CACHE_TTL=3600,
+    ROUTE_CACHE_STALE_TTL=86400,
+    ROUTE_CACHE_BATCH_SIZE=100,
+    ROUTE_CACHE_FLUSH_INTERVAL=3600,
+)
+class RouteCacheStoreTest(TestCase):
+    profile = ors_utils.ORS_PROFILE
+    lanes = {
+        'a': ((-74.006, 40.7128), (-87.6298, 41.8781)),
+        'b': ((-87.6298, 41.8781), (-118.2437, 34.0522)),
+        'c': ((-118.2437, 34.0522), (-74.006, 40.7128)),
+    }
+
+    def setUp(self):
+        self.store = RouteCacheStore()
+
+    def payload(self, distance):
+        return {'distance': distance, 'duration': 60.0, 'geometry': '', 'segments': []}
+
+    def set(self, lane, distance=1000.0):
+        self.store.set(*self.lanes[lane], self.profile, self.payload(distance))
+
+    def get(self, lane, **options):
+        return self.store.get(*self.lanes[lane], self.profile, **options)
+
+    def get_from_table(self, lane):
+        self.store._memory.clear()
+        return self.get(lane)
+
+    def test_nearby_coordinates_share_a_key(self):
+        key = make_cache_key((-74.006, 40.7128), (-87.6298, 41.8781), self.profile)
+
+        self.assertEqual(
+            make_cache_key((-74.00604, 40.71281), (-87.62976, 41.8781), self.profile),
+            key,
+        )
+        self.assertNotEqual(
+            make_cache_key((-74.0061, 40.7128), (-87.6298, 41.8781), self.profile),
+            key,
+        )
+
+    def test_expired_route_is_only_served_stale(self):
+        self.set('a')
+        later = timezone.now() + timedelta(seconds=3600 + 60)
+
+        with mock.patch.object(timezone, 'now', return_value=later):
+            self.assertIsNone(self.get('a'))
+            self.assertEqual(self.get('a', stale=True), self.payload(1000.0))
+            # Not copied back to memory, where it would be served as fresh
+            self.assertIsNone(self.get('a'))
+
+        # Dropped from the table once past the stale TTL too
+        self.store._evict(timezone.now() + timedelta(seconds=86400 + 60))
+        self.assertFalse(RouteCache.objects.exists())
+
+    @override_settings(ROUTE_CACHE_MEMORY_SIZE=2)
+    def test_memory_keeps_the_recently_used_routes(self):
+        self.set('a')
+        self.set('b')
+        self.get('a')
+        self.set('c')
+
+        with self.assertNumQueries(0):
+            self.assertIsNotNone(self.get('a'))
+            self.assertIsNotNone(self.get('c'))
+
+        with self.assertNumQueries(1):
+            self.assertIsNotNone(self.get('b'))
+
+    @override_settings(ROUTE_CACHE_MAX_ENTRIES=2, ROUTE_CACHE_BATCH_SIZE=1)
+    def test_table_drops_the_least_recently_used_rows(self):
+        self.set('a')
+        self.set('b')
+        self.get_from_table('a')
+        self.store.flush_hits()
+
+        self.set('c')
+
+        self.assertEqual(
+            set(RouteCache.objects.values_list('cache_key', flat=True)),
+            {make_cache_key(*self.lanes[lane], self.profile) for lane in 'ac'},
+        )
+        self.assertEqual(self.store.stats()['evictions'], 1)
+
+    def test_hits_are_written_in_one_batch(self):
+        self.set('a')
+        self.set('b')
+
+        # Lookups only read the table
+        with self.assertNumQueries(3):
+            self.get_from_table('a')
+            self.get_from_table('a')
+            self.get_from_table('b')
+        self.assertEqual(sum(RouteCache.objects.values_list('hit_count', flat=True)), 0)
+
+        # One UPDATE per distinct count
+        with self.assertNumQueries(2):
+            self.store.flush_hits()
+
+        hits = dict(RouteCache.objects.values_list('cache_key', 'hit_count'))
+        self.assertEqual(
+            [hits[make_cache_key(*self.lanes[lane], self.profile)] for lane in 'ab'],
+            [2, 1],
+        )
+
+
+class MultiWaypointRouteTest(TestCase):
+    coordinates = [(-74.006, 40.7128), (-87.6298, 41.8781), (-118.2437, 34.0522)]
+
+    def setUp(self):
+        route_cache.clear(persistent=True)
+        self.addCleanup(route_cache.clear)
+
+    @mock.patch.object(
+        ors_utils.ORS_CLIENT,
+        'directions',
+        side_effect=lambda coordinates, **kwargs: synthesize_directions(coordinates),
+    )
+    def test_one_response_is_split_into_its_legs(self, directions):
+        routes = ors_utils.get_ors_routes(self.coordinates)
+
+        directions.assert_called_once()
+        self.assertEqual(len(directions.call_args.kwargs['coordinates']), 3)
+
+        # Each leg is the route the stand-in gives for that leg alone
+        for route, leg in zip(routes, zip(self.coordinates, self.coordinates[1:])):
+            expected = synthesize_directions(leg)['routes'][0]
+            self.assertEqual(
+                route['distance_miles'],
+                Decimal(expected['summary']['distance']) * settings.METERS_TO_MILES,
+            )
+            self.assertEqual(
+                route['duration_hours'],
+                Decimal(expected['summary']['duration']) * settings.SECONDS_TO_HOURS,
+            )
+            self.assertEqual(route['geometry'], expected['geometry'])
+
+        # Both legs are cached, the lanes are not fetched again
+        ors_utils.get_ors_route(*self.coordinates[1:])
+        directions.assert_called_once()
+
+
+@override_settings(ORS_BREAKER_MIN_CALLS=1)
+class StaleRouteTest(TestCase):
+    start = (-74.006, 40.7128)
+    end = (-87.6298, 41.8781)
+
+    def setUp(self):
+        route_cache.clear()
+        ors_utils.ORS_BREAKER.reset()
+        self.addCleanup(route_cache.clear)
+        self.addCleanup(ors_utils.ORS_BREAKER.reset)
+
+    def cache_expired_route(self):
+        route = synthesize_directions([self.start, self.end])['routes'][0]
+        payload = {
+            'distance': route['summary']['distance'],
+            'duration': route['summary']['duration'],
+            'geometry': route['geometry'],
+            'segments': route['segments'][0]['steps'],
+        }
+        route_cache.set(self.start, self.end, ors_utils.ORS_PROFILE, payload)
+
+        RouteCache.objects.update(
+            updated_at=timezone.now() - timedelta(seconds=settings.ROUTE_CACHE_TTL + 60)
+        )
+        # Only the expired row is left, not the fresh copy in memory
+        route_cache.clear()
+
+    @mock.patch.object(
+        ors_utils.ORS_CLIENT, 'directions', side_effect=requests.ConnectionError
+    )
+    def test_expired_route_is_served_stale_while_ors_is_down(self, directions):
+        with self.assertRaises(ors_utils.RoutingFailed):
+            ors_utils.get_ors_route(self.start, self.end)
+
+        self.cache_expired_route()
+        ors_utils.ORS_BREAKER.reset()
+
+        route = ors_utils.get_ors_route(self.start, self.end)
+        self.assertTrue(route['stale'])
+        self.assertEqual(directions.call_count, 2)
+
+        # Open breaker, ORS is not called at all
+        self.assertEqual(ors_utils.ORS_BREAKER.state, CircuitBreaker.OPEN)
+        route = ors_utils.get_ors_route(self.start, self.end)
+        self.assertTrue(route['stale'])
+        self.assertEqual(directions.call_count, 2)
+
+
+class TripSingleFlightTest(TransactionTestCase):
+    def setUp(self):
+        cache.clear()
+        route_cache.clear()
+        ors_utils.ORS_BREAKER.reset()
+        self.addCleanup(route_cache.clear)
+
+    def slow_directions(self, coordinates, **kwargs):
+        # Long enough for the second calculation to start meanwhile
+        time.sleep(0.3)
+
+        return synthesize_directions(coordinates)
+
+    def calculate(self, trip_data):
+        try:
+            return run_trip_calculation(**trip_data)
+        finally:
+            close_old_connections()
+
+    def test_concurrent_identical_calculations_compute_once(self):
+        # The same trip, written differently
+        duplicate = {**TRIP_DATA, 'pickup_location': '  chicago, il '}
+
+        with mock.patch.object(
+            ors_utils.ORS_CLIENT, 'directions', side_effect=self.slow_directions
+        ) as directions:
+            with ThreadPoolExecutor(2) as executor:
+                trips = list(executor.map(self.calculate, [TRIP_DATA, duplicate]))
+
+        self.assertEqual(trips[0].id, trips[1].id)
+        self.assertEqual(Trip.objects.count(), 1)
+        self.assertEqual(directions.call_count, 1)
+
+
+class TripCalculateIdempotencyTest(TestCase):
+    url = '/api/trips/calculate'
+
+    def setUp(self):
+        cache.clear()
+        user = get_user_model().objects.create_user(
+            'driver', 'driver@example.com', 'driver-password'
+        )
+        self.client = APIClient()
+        self.client.force_authenticate(user)
+        self.body = {**TRIP_DATA, 'current_cycle_used': '10'}
+        del self.body['current_cycle_used_hrs']
+
+    def post(self, body, key='trip-1'):
+        return self.client.post(self.url, body, format='json', HTTP_IDEMPOTENCY_KEY=key)
+
+    def calculate(self, **trip_data):
+        return persist_trip_plan(synthetic_plan(300))
+
+    @mock.patch('apps.trip.views.trip_view.run_trip_calculation')
+    def test_retry_replays_the_first_response(self, run_trip_calculation):
+        run_trip_calculation.side_effect = self.calculate
+
+        first = self.post(self.body)
+        retry = self.post(self.body)
+
+        self.assertEqual(first.status_code, 201)
+        self.assertEqual(retry.status_code, 201)
+        self.assertEqual(retry['Idempotent-Replayed'], 'true')
+        self.assertEqual(retry.data['id'], first.data['id'])
+        self.assertEqual(run_trip_calculation.call_count, 1)
+        self.assertEqual(Trip.objects.count(), 1)
+
+    @mock.patch('apps.trip.views.trip_view.run_trip_calculation')
+    def test_key_in_flight_is_a_conflict(self, run_trip_calculation):
+        retries = []
+
+        def calculate(**trip_data):
+            # The client retries before the first request answered
+            retries.append(self.post(self.body))
+            return self.calculate(**trip_data)
+
+        run_trip_calculation.side_effect = calculate
+
+        self.assertEqual(self.post(self.body).status_code, 201)
+        self.assertEqual(retries[0].status_code, 409)
+        self.assertEqual(retries[0]['Retry-After'], '1')
+        self.assertEqual(run_trip_calculation.call_count, 1)
+
+    @mock.patch('apps.trip.views.trip_view.run_trip_calculation')
+    def test_key_reused_with_another_body_is_rejected(self, run_trip_calculation):
+        run_trip_calculation.side_effect = self.calculate
+
+        self.post(self.body)
+        response = self.post({**self.body, 'current_cycle_used': '11'})
+
+        self.assertEqual(response.status_code, 422)
+        self.assertEqual(run_trip_calculation.call_count, 1)
+
+    @mock.patch('apps.trip.views.trip_view.run_trip_calculation')
+    def test_upstream_failure_is_not_replayed(self, run_trip_calculation):
+        run_trip_calculation.side_effect = ors_utils.RoutingFailed(
+            'Failed to get route from ORS: timed out'
+        )
+        self.assertEqual(self.post(self.body).status_code, 502)
+
+        run_trip_calculation.side_effect = self.calculate
+        response = self.post(self.body)
+
+        self.assertEqual(response.status_code, 201)
+        self.assertNotIn('Idempotent-Replayed', response)
+        self.assertEqual(run_trip_calculation.call_count, 2)
+
+
+class TripCalculateAsyncViewTest(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.user = get_user_model().objects.create_user(
+            'driver', 'driver@example.com', 'driver-password'
+        )
+        self.body = {**TRIP_DATA, 'current_cycle_used': '10'}
+        del self.body['current_cycle_used_hrs']
+
+    def post(self, user=None, **headers):
+        request = APIRequestFactory().post(
+            '/api/trips/calculate', self.body, format='json', **headers
+        )
+        if user is not None:
+            force_authenticate(request, user)
+
+        return async_to_sync(TripCalculateAsyncView.as_view())(request)
+
+    @mock.patch('apps.trip.views.trip_view.arun_trip_calculation')
+    def test_calculates_the_trip(self, arun_trip_calculation):
+        arun_trip_calculation.return_value = persist_trip_plan(synthetic_plan(300))
+
+        response = self.post(self.user)
+
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual(response.data['id'], str(Trip.objects.get().id))
+
+    @mock.patch('apps.trip.views.trip_view.arun_trip_calculation')
+    def test_retry_replays_the_first_response(self, arun_trip_calculation):
+        arun_trip_calculation.return_value = persist_trip_plan(synthetic_plan(300))
+
+        first = self.post(self.user, HTTP_IDEMPOTENCY_KEY='trip-1')
+        retry = self.post(self.user, HTTP_IDEMPOTENCY_KEY='trip-1')
+
+        self.assertEqual(retry.status_code, 201)
+        self.assertEqual(retry['Idempotent-Replayed'], 'true')
+        self.assertEqual(retry.data['id'], first.data['id'])
+        self.assertEqual(arun_trip_calculation.call_count, 1)
+
+    @mock.patch('apps.trip.views.trip_view.arun_trip_calculation')
+    def test_is_authenticated_and_throttled_as_trip_view(self, arun_trip_calculation):
+        self.assertEqual(self.post().status_code, 401)
+
+        with (
+            mock.patch.object(UserRateThrottle, 'allow_request', return_value=False),
+            mock.patch.object(UserRateThrottle, 'wait', return_value=30),
+        ):
+            response = self.post(self.user)
+
+        self.assertEqual(response.status_code, 429)
+        self.assertEqual(response['Retry-After'], '30')
+        arun_trip_calculation.assert_not_called()
+
+
+@override_settings(TRIP_BATCH_WORKERS=1)
+class TripCalculateBatchTest(TestCase):
+    url = '/api/trips/calculate/batch'
+
+    def setUp(self):
+        cache.clear()
+        route_cache.clear()
+        ors_utils.ORS_BREAKER.reset()
+        self.addCleanup(route_cache.clear)
+        user = get_user_model().objects.create_user(
+            'dispatcher', 'dispatcher@example.com', 'dispatcher-password'
+        )
+        self.client = APIClient()
+        self.client.force_authenticate(user)
+        self.body = {**TRIP_DATA, 'current_cycle_used': '10'}
+        del self.body['current_cycle_used_hrs']
+
+    def directions(self, coordinates, **kwargs):
+        if [0.0, 0.0] in coordinates:
+            raise ApiError(404, {'error': {'code': 2010, 'message': 'No route found'}})
+
+        return synthesize_directions(coordinates)
+
+    def test_items_fail_on_their_own(self):
+        trips = [
+            self.body,
+            {**self.body, 'pickup_coordinates': ''},
+            {**self.body, 'dropoff_coordinates': '0.0,0.0'},
+            {**self.body, 'current_cycle_used': '11'},
+        ]
+
+        with mock.patch.object(
+            ors_utils.ORS_CLIENT, 'directions', side_effect=self.directions
+        ) as directions:
+            response = self.client.post(self.url, {'trips': trips}, format='json')
+
+        self.assertEqual(response.status_code, 200)
+        results = response.data['results']
+        self.assertEqual(
+            [result['status'] for result in results],
+            ['success', 'error', 'error', 'success'],
+        )
+        self.assertEqual(results[1]['error'], 'Validation error')
+        self.assertIn('pickup_coordinates', results[1]['detail'])
+        self.assertEqual(results[2]['detail'], 'No route found')
+        self.assertEqual(Trip.objects.count(), 2)
+
+        # The shared current to pickup leg is fetched once, then cached
+        self.assertEqual(directions.call_count, 3)
+        self.assertEqual(RouteCache.objects.count(), 2)
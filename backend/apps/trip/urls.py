@@ -1,15 +1,30 @@
+from django.conf import settings
 from django.urls import path
 
-from apps.trip.views.trip_view import TripView, TripSummaryView
+from apps.trip.views.trip_view import (
+    TripView,
+    TripJobView,
+    TripStatsView,
+    TripSummaryView,
+    TripCalculateAsyncView,
+)
 
 
 trip_list = TripView.as_view({'get': 'list'})
-trip_calc = TripView.as_view({'post': 'calculate_trip'})
-trip_delete = TripView.as_view({'delete': 'destroy'})
+trip_calc = (
+    TripCalculateAsyncView.as_view()
+    if settings.TRIP_ASYNC_CALCULATE
+    else TripView.as_view({'post': 'calculate_trip'})
+)
+trip_calc_batch = TripView.as_view({'post': 'calculate_batch'})
+trip_detail = TripView.as_view({'get': 'retrieve', 'delete': 'destroy'})
 
 urlpatterns = [
     path('', trip_list, name='trip_list'),
-    path('<uuid:uid>/', trip_delete, name='trip_delete'),
+    path('<uuid:uid>/', trip_detail, name='trip_detail'),
     path('<uuid:uid>/summary/', TripSummaryView.as_view(), name='trip_summary'),
     path('calculate', trip_calc, name='trip_calc'),
+    path('calculate/batch', trip_calc_batch, name='trip_calc_batch'),
+    path('jobs/<uuid:uid>/', TripJobView.as_view(), name='trip_job'),
+    path('stats/', TripStatsView.as_view(), name='trip_stats'),
 ]
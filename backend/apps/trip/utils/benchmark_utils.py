@@ -0,0 +1,214 @@
+import gc
+import time
+import statistics
+import tracemalloc
+
+from decimal import Decimal
+from datetime import UTC, datetime
+
+from apps.trip.utils.ors_utils import build_route
+from apps.trip.utils.trip_utils import ELDTripPlanner
+from apps.trip.utils.ors_standin_utils import synthesize_directions
+
+
+# `(miles, cycle hours used)` of the benchmarked trips, all within the
+# 70-hour cycle so that every case runs its legs and long-haul days to the end
+BENCHMARK_CASES = (
+    (50, '0'),
+    (50, '60'),
+    (500, '0'),
+    (500, '45'),
+    (1500, '0'),
+    (1500, '30'),
+    (3000, '0'),
+    (3000, '10'),
+)
+
+# New York to Chicago to Los Angeles, [lon, lat]
+CURRENT_COORDS = (-74.006, 40.7128)
+PICKUP_COORDS = (-87.6298, 41.8781)
+DROPOFF_COORDS = (-118.2437, 34.0522)
+
+# Share of the trip driven before the pickup
+LEG1_SHARE = 0.1
+
+START_TIME = datetime(2026, 1, 5, 7, tzinfo=UTC)
+
+# Metrics compared to the baseline, lower is better. The best time is the
+# least disturbed by other processes, and is compared as a ratio to the
+# calibration loop so that a baseline holds on a slower or faster machine
+METRICS = ('best_ratio', 'peak_kib')
+
+# Steps of the calibration loop, about as long as a short trip plan
+CALIBRATION_STEPS = 5000
+
+
+class BenchmarkPlanner(ELDTripPlanner):
+    """Planner starting at a fixed time, so every run plans the same trip."""
+
+    def _get_next_start_time(self):
+        return START_TIME
+
+
+def make_route(start_coords, end_coords, miles):
+    """Route of `miles` between two points, as returned by `get_ors_route`."""
+    route = synthesize_directions([start_coords, end_coords], miles=miles)['routes'][0]
+
+    return build_route(
+        {
+            'distance': route['summary']['distance'],
+            'duration': route['summary']['duration'],
+            'geometry': route['geometry'],
+            'segments': route['segments'][0]['steps'],
+        }
+    )
+
+
+def make_route_fixtures(miles):
+    """Canned routes of a trip of `miles`, keyed by leg."""
+    return {
+        (CURRENT_COORDS, PICKUP_COORDS): make_route(
+            CURRENT_COORDS, PICKUP_COORDS, miles * LEG1_SHARE
+        ),
+        (PICKUP_COORDS, DROPOFF_COORDS): make_route(
+            PICKUP_COORDS, DROPOFF_COORDS, miles * (1 - LEG1_SHARE)
+        ),
+    }
+
+
+def get_case_name(miles, cycle_used):
+    return f'{miles}mi@{cycle_used}h'
+
+
+def parse_case(value):
+    """`(miles, cycle hours used)` of a `MILES@CYCLE` argument, e.g. `3000@10`."""
+    miles, _, cycle_used = value.partition('@')
+
+    try:
+        miles = int(miles)
+        cycle_used = str(Decimal(cycle_used or '0'))
+    except (ValueError, ArithmeticError):
+        raise ValueError(f'Invalid case {value!r}, expected MILES@CYCLE.')
+
+    return miles, cycle_used
+
+
+def _plan(planner, cycle_used):
+    """Outcome of a plan: its number of stops, or the planner error."""
+    try:
+        plan = planner.create_trip_plan(
+            current_coords=CURRENT_COORDS,
+            pickup_coords=PICKUP_COORDS,
+            dropoff_coords=DROPOFF_COORDS,
+            current_cycle_used=Decimal(cycle_used),
+            current_location='New York, NY',
+            pickup_location='Chicago, IL',
+            dropoff_location='Los Angeles, CA',
+        )
+    except ValueError as e:
+        return f'error: {e}'
+
+    return f'{len(plan["trip_routes"])} stops, {len(plan["daily_logs"])} logs'
+
+
+def _reference_loop():
+    """
+    Calibration loop, fixed work of the same kind as planning: integers,
+    Decimals and dicts.
+    """
+    ticks = 0
+    hours = Decimal(0)
+    stops = []
+
+    for step in range(CALIBRATION_STEPS):
+        ticks += step % 7
+        hours += Decimal(step % 11) / 4
+        stops.append({'ticks': ticks, 'hours': hours})
+
+    return len(stops)
+
+
+def run_case(miles, cycle_used, repeat=20):
+    """
+    Time `repeat` plans of a trip, then trace the memory of one more.
+
+    A trip beyond the 70-hour cycle ends with the planner error, which is
+    its outcome; it is timed up to it all the same. Each plan is preceded by
+    a run of the calibration loop, the best times of both give `best_ratio`
+    under the same load of the machine.
+    """
+    routes = make_route_fixtures(miles)
+    planner = BenchmarkPlanner(lambda start, end: routes[start, end])
+
+    # Warm-up, e.g. the lazily compiled HOS rules
+    outcome = _plan(planner, cycle_used)
+
+    timings = []
+    calibration = []
+    # As timeit does, no collection pause lands in a single timed plan
+    gc.disable()
+    try:
+        for _ in range(repeat):
+            started = time.perf_counter()
+            _reference_loop()
+            calibration.append((time.perf_counter() - started) * 1000)
+
+            started = time.perf_counter()
+            _plan(planner, cycle_used)
+            timings.append((time.perf_counter() - started) * 1000)
+    finally:
+        gc.enable()
+
+    tracemalloc.start()
+    try:
+        _plan(planner, cycle_used)
+        _, peak = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+
+    return {
+        'miles': miles,
+        'cycle_used': cycle_used,
+        'outcome': outcome,
+        'best_ms': round(min(timings), 3),
+        'best_ratio': round(min(timings) / min(calibration), 3),
+        'median_ms': round(statistics.median(timings), 3),
+        'peak_kib': round(peak / 1024, 1),
+    }
+
+
+def run_benchmarks(cases=BENCHMARK_CASES, repeat=20):
+    """Results of every `(miles, cycle used)` case, keyed by case name."""
+    return {
+        get_case_name(miles, cycle_used): run_case(miles, cycle_used, repeat)
+        for miles, cycle_used in cases
+    }
+
+
+def compare_to_baseline(results, baseline, threshold):
+    """
+    Regressions of `results` against `baseline`: every metric more than
+    `threshold` above its baseline, as a fraction, and every changed outcome.
+    Cases missing from the baseline are not compared.
+    """
+    regressions = []
+
+    for name, result in results.items():
+        expected = baseline.get(name)
+        if expected is None:
+            continue
+
+        if result['outcome'] != expected['outcome']:
+            regressions.append(
+                f'{name}: outcome {expected["outcome"]!r} is now {result["outcome"]!r}'
+            )
+
+        for metric in METRICS:
+            limit = expected[metric] * (1 + threshold)
+            if result[metric] > limit:
+                regressions.append(
+                    f'{name}: {metric} {result[metric]} over {expected[metric]} '
+                    f'+{threshold:.0%}'
+                )
+
+    return regressions
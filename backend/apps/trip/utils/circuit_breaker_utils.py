@@ -0,0 +1,109 @@
+import time
+import threading
+
+from collections import deque
+
+from django.conf import settings
+from rest_framework import status
+from rest_framework.exceptions import APIException
+
+
+class RoutingUnavailable(APIException):
+    status_code = status.HTTP_503_SERVICE_UNAVAILABLE
+    default_detail = 'Routing service unavailable, try again later.'
+    default_code = 'routing_unavailable'
+
+
+class CircuitBreaker:
+    """
+    Per-process circuit breaker over the outcome of the last calls.
+
+    Closed, calls go through and their outcome is recorded. Once at least
+    `ORS_BREAKER_MIN_CALLS` of the last `ORS_BREAKER_WINDOW` calls were made
+    and `ORS_BREAKER_FAILURE_RATE` of them failed, it opens and rejects calls
+    for `ORS_BREAKER_RESET_TIMEOUT` seconds. It then lets a single trial call
+    through, half-open, which closes it again or reopens it.
+    """
+
+    CLOSED = 'closed'
+    OPEN = 'open'
+    HALF_OPEN = 'half_open'
+
+    def __init__(self, name):
+        self.name = name
+        self._lock = threading.Lock()
+        self._state = self.CLOSED
+        self._outcomes = deque(maxlen=settings.ORS_BREAKER_WINDOW)
+        self._opened_at = None
+        self._stats = {'failures': 0, 'rejected': 0, 'opened': 0}
+
+    @property
+    def state(self):
+        with self._lock:
+            return self._state
+
+    def retry_after(self):
+        """Seconds until an open breaker lets a trial call through."""
+        with self._lock:
+            if self._state != self.OPEN:
+                return 0
+
+            elapsed = time.monotonic() - self._opened_at
+            return max(settings.ORS_BREAKER_RESET_TIMEOUT - elapsed, 0)
+
+    def allow(self):
+        """Whether a call may be made now."""
+        with self._lock:
+            if self._state == self.CLOSED:
+                return True
+
+            if self._state == self.OPEN:
+                elapsed = time.monotonic() - self._opened_at
+                if elapsed >= settings.ORS_BREAKER_RESET_TIMEOUT:
+                    # Only the caller getting here makes the trial call
+                    self._state = self.HALF_OPEN
+                    return True
+
+            self._stats['rejected'] += 1
+            return False
+
+    def record_success(self):
+        with self._lock:
+            if self._state == self.HALF_OPEN:
+                self._state = self.CLOSED
+                self._outcomes.clear()
+
+            self._outcomes.append(True)
+
+    def record_failure(self):
+        with self._lock:
+            self._stats['failures'] += 1
+
+            if self._state == self.HALF_OPEN:
+                self._open()
+                return
+
+            self._outcomes.append(False)
+            failures = self._outcomes.count(False)
+
+            if (
+                len(self._outcomes) >= settings.ORS_BREAKER_MIN_CALLS
+                and failures / len(self._outcomes) >= settings.ORS_BREAKER_FAILURE_RATE
+            ):
+                self._open()
+
+    def _open(self):
+        self._state = self.OPEN
+        self._opened_at = time.monotonic()
+        self._outcomes.clear()
+        self._stats['opened'] += 1
+
+    def reset(self):
+        with self._lock:
+            self._state = self.CLOSED
+            self._outcomes.clear()
+            self._opened_at = None
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {'state': self._state, **self._stats}
@@ -0,0 +1,135 @@
+import json
+
+import numpy as np
+
+from shapely import LineString
+from openrouteservice import convert
+
+
+EARTH_RADIUS_MILES = 3958.8
+
+
+def _encode_value(value):
+    value = ~(value << 1) if value < 0 else value << 1
+    chunks = []
+
+    while value >= 0x20:
+        chunks.append(chr((0x20 | (value & 0x1F)) + 63))
+        value >>= 5
+
+    chunks.append(chr(value + 63))
+
+    return ''.join(chunks)
+
+
+def encode_polyline(coordinates, precision=5):
+    """
+    Encode [lon, lat] pairs into an encoded polyline string.
+
+    The output uses the same lat/lon order and precision as ORS, so it can be
+    read back with `openrouteservice.convert.decode_polyline`.
+    """
+    factor = 10**precision
+    encoded = []
+    prev_lat = prev_lon = 0
+
+    for lon, lat in coordinates:
+        lat = round(lat * factor)
+        lon = round(lon * factor)
+        encoded.append(_encode_value(lat - prev_lat))
+        encoded.append(_encode_value(lon - prev_lon))
+        prev_lat, prev_lon = lat, lon
+
+    return ''.join(encoded)
+
+
+def decode_polyline(polyline):
+    """Decode an ORS encoded polyline into a list of [lon, lat] pairs."""
+    return convert.decode_polyline(polyline)['coordinates']
+
+
+def polyline_to_geojson(polyline):
+    """GeoJSON LineString string of an encoded polyline."""
+    return json.dumps({'type': 'LineString', 'coordinates': decode_polyline(polyline)})
+
+
+def simplify_route(coordinates, tolerances):
+    """
+    Simplify a route at each tolerance, in degrees, with Douglas-Peucker.
+
+    Returns a dict of encoded polylines keyed on the tolerance.
+    """
+    if len(coordinates) < 2:
+        return {}
+
+    line = LineString(coordinates)
+
+    return {
+        f'{tolerance:g}': encode_polyline(
+            line.simplify(tolerance, preserve_topology=False).coords
+        )
+        for tolerance in tolerances
+    }
+
+
+def zoom_to_tolerance(zoom):
+    """Width of a 256px web map tile pixel at `zoom`, in degrees."""
+    return 360 / (256 * 2**zoom)
+
+
+def pick_route_level(levels, tolerance):
+    """
+    Return the polyline of the coarsest level within `tolerance`, or None
+    when the full geometry is needed.
+    """
+    candidates = [key for key in levels or {} if float(key) <= tolerance]
+    if not candidates:
+        return None
+
+    return levels[max(candidates, key=float)]
+
+
+class RouteIndex:
+    """
+    Cumulative-mileage index over a decoded route polyline.
+
+    The great-circle length of every edge is summed once when the index is
+    built, after that a point along the route is found with a binary search
+    on the cumulative array and a linear interpolation on the matching edge,
+    O(log n) per lookup.
+    """
+
+    def __init__(self, coordinates):
+        self.points = np.asarray(coordinates, dtype=float).reshape(-1, 2)
+
+        lon, lat = np.radians(self.points[:, 0]), np.radians(self.points[:, 1])
+        a = (
+            np.sin(np.diff(lat) / 2) ** 2
+            + np.cos(lat[:-1]) * np.cos(lat[1:]) * np.sin(np.diff(lon) / 2) ** 2
+        )
+        edges = 2 * EARTH_RADIUS_MILES * np.arcsin(np.sqrt(a))
+
+        self.cumulative = np.concatenate(([0.0], np.cumsum(edges)))
+        self.length = float(self.cumulative[-1])
+
+    def locate(self, miles):
+        """Return the (lon, lat) point `miles` along the route."""
+        miles = min(max(miles, 0.0), self.length)
+        index = int(np.searchsorted(self.cumulative, miles, side='right'))
+
+        if index >= len(self.points):
+            lon, lat = self.points[-1]
+            return float(lon), float(lat)
+
+        start = self.cumulative[index - 1]
+        span = self.cumulative[index] - start
+        ratio = (miles - start) / span if span else 0.0
+        lon, lat = self.points[index - 1] + ratio * (
+            self.points[index] - self.points[index - 1]
+        )
+
+        return float(lon), float(lat)
+
+    def locate_fraction(self, fraction):
+        """Return the (lon, lat) point at `fraction` of the route length."""
+        return self.locate(fraction * self.length)
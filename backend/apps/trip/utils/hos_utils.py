@@ -0,0 +1,103 @@
+from decimal import ROUND_HALF_UP, Decimal
+from datetime import datetime, timedelta
+from functools import lru_cache
+from dataclasses import dataclass
+
+from django.conf import settings
+
+
+HOURS_PRECISION = Decimal('0.01')
+
+# Fixed-point distance unit, 1/600 of a mile (a sixtieth of a tenth)
+UNITS_PER_MILE = 600
+
+
+def _to_int(value) -> int:
+    return int(value.to_integral_value(ROUND_HALF_UP))
+
+
+@dataclass(frozen=True)
+class HOSRules:
+    """
+    FMCSA HOS limits compiled once into fixed-point integers.
+
+    Durations are whole minutes scaled by the average speed in tenths of a
+    mile per hour, and distances are tenths of a mile scaled by 60. One tick
+    is then 1/600 of a mile and also the time needed to drive it, so driving
+    time and distance are the same integer and the planner never rounds.
+    """
+
+    ticks_per_minute: int
+    max_driving: int
+    max_on_duty: int
+    off_duty: int
+    break_after: int
+    break_duration: int
+    max_cycle: int
+    fueling_interval: int
+    fueling_duration: int
+    pickup_dropoff_duration: int
+    start_hour: int
+
+    @classmethod
+    def from_settings(cls):
+        ticks_per_minute = _to_int(Decimal(settings.AVERAGE_SPEED_MPH) * 10)
+
+        def ticks(hours):
+            return _to_int(Decimal(hours) * 60) * ticks_per_minute
+
+        return cls(
+            ticks_per_minute=ticks_per_minute,
+            max_driving=ticks(settings.MAX_DRIVING_HOURS_PER_DAY),
+            max_on_duty=ticks(settings.MAX_ON_DUTY_HOURS_PER_DAY),
+            off_duty=ticks(settings.REQUIRED_OFF_DUTY_HOURS),
+            break_after=ticks(settings.REQUIRED_BREAK_AFTER_HOURS),
+            break_duration=ticks(settings.REQUIRED_BREAK_DURATION),
+            max_cycle=ticks(settings.MAX_CYCLE_HOURS),
+            fueling_interval=_to_int(Decimal(settings.FUELING_INTERVAL_MILES) * 10)
+            * (UNITS_PER_MILE // 10),
+            fueling_duration=ticks(settings.FUELING_DURATION_HOURS),
+            pickup_dropoff_duration=ticks(settings.PICKUP_DROPOFF_DURATION),
+            start_hour=settings.START_TIME_HOUR,
+        )
+
+    @property
+    def ticks_per_hour(self) -> int:
+        return self.ticks_per_minute * 60
+
+    def hours_to_ticks(self, hours) -> int:
+        return _to_int(Decimal(hours) * self.ticks_per_hour)
+
+    def miles_to_ticks(self, miles) -> int:
+        return _to_int(Decimal(miles) * UNITS_PER_MILE)
+
+    def ticks_to_hours(self, ticks: int, quantize=False) -> Decimal:
+        """Convert ticks back to Decimal hours for serialization."""
+        hours = Decimal(ticks) / self.ticks_per_hour
+
+        return hours.quantize(HOURS_PRECISION) if quantize else hours
+
+    def ticks_to_miles(self, ticks: int) -> float:
+        return ticks / UNITS_PER_MILE
+
+    def ticks_to_timedelta(self, ticks: int) -> timedelta:
+        return timedelta(microseconds=ticks * 60_000_000 // self.ticks_per_minute)
+
+
+@lru_cache(maxsize=1)
+def get_hos_rules() -> HOSRules:
+    return HOSRules.from_settings()
+
+
+@dataclass
+class DutyClock:
+    """Running duty counters of a driver while a trip is planned, in ticks."""
+
+    start_time: datetime
+    elapsed: int = 0
+    order: int = 0
+    daily_driving: int = 0
+    daily_on_duty: int = 0
+    consecutive_driving: int = 0
+    cycle_used: int = 0
+    miles_since_fuel: int = 0
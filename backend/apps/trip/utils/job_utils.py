@@ -0,0 +1,111 @@
+from decimal import Decimal
+from datetime import timedelta
+
+from django.db import transaction
+from django.utils import timezone
+from django.db.models import F
+
+from apps.trip.utils.trip_utils import run_trip_calculations
+from apps.trip.models.trip_job_models import TripJob, TripJobStatus
+from apps.trip.utils.circuit_breaker_utils import RoutingUnavailable
+
+
+def get_error_result(error):
+    if isinstance(error, RoutingUnavailable):
+        return {'error': 'Routing unavailable', 'detail': str(error.detail)}
+
+    if isinstance(error, ValueError):
+        return {'error': 'Calculation error', 'detail': str(error)}
+
+    return {'error': 'Trip calculation failed.', 'detail': str(error)}
+
+
+def enqueue_trip_job(trip_data, user=None):
+    """Queue a trip calculation, `trip_data` as given to the calculation."""
+    payload = {
+        **trip_data,
+        'current_cycle_used_hrs': str(trip_data['current_cycle_used_hrs']),
+    }
+
+    return TripJob.objects.create(payload=payload, created_by=user)
+
+
+def claim_trip_jobs(limit):
+    """
+    Take up to `limit` of the oldest pending jobs for this worker.
+
+    Rows locked by another worker are skipped where the database supports
+    it, and a job is only claimed when it is still pending, so concurrent
+    workers never run the same job.
+    """
+    with transaction.atomic():
+        candidates = list(
+            TripJob.objects.select_for_update(skip_locked=True)
+            .filter(status=TripJobStatus.PENDING)
+            .order_by('created_at')
+            .values_list('id', flat=True)[:limit]
+        )
+
+        now = timezone.now()
+        claimed = [
+            job_id
+            for job_id in candidates
+            if TripJob.objects.filter(id=job_id, status=TripJobStatus.PENDING).update(
+                status=TripJobStatus.RUNNING,
+                started_at=now,
+                attempts=F('attempts') + 1,
+            )
+        ]
+
+    return list(TripJob.objects.filter(id__in=claimed).order_by('created_at'))
+
+
+def requeue_stale_jobs(stale_after, max_attempts):
+    """
+    Recover jobs left running by a worker that died. They go back to the
+    queue, or fail once they were attempted `max_attempts` times.
+    """
+    stale = TripJob.objects.filter(
+        status=TripJobStatus.RUNNING,
+        started_at__lt=timezone.now() - timedelta(seconds=stale_after),
+    )
+
+    failed = stale.filter(attempts__gte=max_attempts).update(
+        status=TripJobStatus.FAILED,
+        error={'error': 'Trip calculation failed.', 'detail': 'Worker timed out.'},
+        finished_at=timezone.now(),
+    )
+    requeued = stale.update(status=TripJobStatus.PENDING)
+
+    return requeued, failed
+
+
+def run_trip_jobs(jobs):
+    """Calculate claimed jobs as one batch and record their outcome."""
+    trips = [
+        {
+            **job.payload,
+            'current_cycle_used_hrs': Decimal(job.payload['current_cycle_used_hrs']),
+        }
+        for job in jobs
+    ]
+
+    try:
+        results = run_trip_calculations(trips)
+    except Exception as e:
+        results = [e] * len(jobs)
+
+    now = timezone.now()
+    for job, result in zip(jobs, results):
+        job.finished_at = now
+
+        if isinstance(result, Exception):
+            job.status = TripJobStatus.FAILED
+            job.error = get_error_result(result)
+        else:
+            job.status = TripJobStatus.SUCCEEDED
+            job.trip = result
+
+    TripJob.objects.bulk_update(jobs, ['status', 'trip', 'error', 'finished_at'])
+
+    return jobs
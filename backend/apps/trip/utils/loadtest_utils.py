@@ -0,0 +1,258 @@
+import time
+import random
+import threading
+import statistics
+
+from collections import defaultdict
+
+import requests
+
+
+LOGIN = 'login'
+CALCULATE = 'calculate'
+LIST = 'list'
+SUMMARY = 'summary'
+DELETE = 'delete'
+
+ENDPOINTS = (LOGIN, CALCULATE, LIST, SUMMARY, DELETE)
+
+# Share of each request in the default mix, in percent
+DEFAULT_MIX = {CALCULATE: 30, LIST: 30, SUMMARY: 25, DELETE: 10, LOGIN: 5}
+
+# Cities the calculated trips run between, `lat,lon` as the API expects.
+# Regional, so that most trips fit in the 70-hour cycle
+CITIES = (
+    ('Chicago, IL', '41.8781,-87.6298'),
+    ('St. Louis, MO', '38.6270,-90.1994'),
+    ('Memphis, TN', '35.1495,-90.0490'),
+    ('Nashville, TN', '36.1627,-86.7816'),
+    ('Atlanta, GA', '33.7490,-84.3880'),
+    ('Columbus, OH', '39.9612,-82.9988'),
+    ('Indianapolis, IN', '39.7684,-86.1581'),
+    ('Dallas, TX', '32.7767,-96.7970'),
+)
+
+REQUEST_TIMEOUT = 60
+
+
+def parse_mix(value):
+    """Request mix from `calculate=30,list=30,...`, weights per endpoint."""
+    mix = {}
+    for part in value.split(','):
+        name, _, weight = part.partition('=')
+        name = name.strip()
+
+        if name not in ENDPOINTS:
+            raise ValueError(f'Unknown endpoint {name!r}, use {", ".join(ENDPOINTS)}.')
+
+        try:
+            mix[name] = float(weight)
+        except ValueError:
+            raise ValueError(f'Invalid weight {weight!r} for {name}.')
+
+    if not any(weight > 0 for weight in mix.values()):
+        raise ValueError('The mix needs at least one positive weight.')
+
+    return mix
+
+
+def make_trip_payload(rng):
+    """Calculate payload between three random cities."""
+    current, pickup, dropoff = rng.sample(CITIES, 3)
+
+    return {
+        'current_location': current[0],
+        'current_coordinates': current[1],
+        'pickup_location': pickup[0],
+        'pickup_coordinates': pickup[1],
+        'dropoff_location': dropoff[0],
+        'dropoff_coordinates': dropoff[1],
+        'current_cycle_used': str(rng.randrange(0, 12)),
+    }
+
+
+class Recorder:
+    """Latencies and status codes of the requests, per endpoint."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.latencies = defaultdict(list)
+        self.statuses = defaultdict(lambda: defaultdict(int))
+
+    def record(self, endpoint, status, seconds):
+        with self._lock:
+            self.latencies[endpoint].append(seconds * 1000)
+            self.statuses[endpoint][status] += 1
+
+
+class LoadWorker(threading.Thread):
+    """
+    Virtual user: logs in, then sends requests drawn from the mix until the
+    deadline. Summaries and deletes only target the trips it calculated, so
+    another user deleting a trip never turns them into 404s; without one yet
+    they calculate one instead.
+    """
+
+    def __init__(self, base_url, credentials, mix, deadline, recorder, seed):
+        super().__init__(daemon=True)
+        self.base_url = base_url.rstrip('/')
+        self.credentials = credentials
+        self.endpoints = list(mix)
+        self.weights = list(mix.values())
+        self.deadline = deadline
+        self.recorder = recorder
+        self.rng = random.Random(seed)
+        self.session = requests.Session()
+        self.trip_ids = []
+
+    def _request(self, endpoint, method, path, **kwargs):
+        started = time.perf_counter()
+        try:
+            response = self.session.request(
+                method, f'{self.base_url}{path}', timeout=REQUEST_TIMEOUT, **kwargs
+            )
+        except requests.RequestException:
+            self.recorder.record(endpoint, 'failed', time.perf_counter() - started)
+            return None
+
+        self.recorder.record(
+            endpoint, response.status_code, time.perf_counter() - started
+        )
+
+        return response
+
+    def login(self):
+        response = self._request(
+            LOGIN, 'post', '/api/auth/login/', json=self.credentials
+        )
+
+        if response is not None and response.status_code == 200:
+            # The cookies are Secure, the token is sent as a header instead
+            self.session.cookies.clear()
+            token = response.json().get('access')
+            self.session.headers['Authorization'] = f'Bearer {token}'
+
+    def calculate(self):
+        response = self._request(
+            CALCULATE,
+            'post',
+            '/api/trips/calculate',
+            json=make_trip_payload(self.rng),
+        )
+
+        if response is not None and response.status_code == 201:
+            self.trip_ids.append(response.json()['id'])
+
+        return response
+
+    def list(self):
+        return self._request(LIST, 'get', '/api/trips/?size=100')
+
+    def summary(self):
+        if not self.trip_ids:
+            return self.calculate()
+
+        trip_id = self.rng.choice(self.trip_ids)
+
+        return self._request(SUMMARY, 'get', f'/api/trips/{trip_id}/summary/')
+
+    def delete(self):
+        if not self.trip_ids:
+            return self.calculate()
+
+        trip_id = self.trip_ids.pop(self.rng.randrange(len(self.trip_ids)))
+
+        return self._request(DELETE, 'delete', f'/api/trips/{trip_id}/')
+
+    def run(self):
+        self.login()
+
+        while time.monotonic() < self.deadline:
+            endpoint = self.rng.choices(self.endpoints, self.weights)[0]
+            response = getattr(self, endpoint)()
+
+            # Expired access token, as a real client would
+            if response is not None and response.status_code == 401:
+                self.login()
+
+        self.session.close()
+
+
+def percentile(latencies, percent):
+    """`percent`-th percentile of a sorted list, nearest rank."""
+    index = max(round(percent / 100 * len(latencies)) - 1, 0)
+
+    return latencies[min(index, len(latencies) - 1)]
+
+
+def summarize(recorder, elapsed):
+    """Throughput and latency percentiles per endpoint, and in total."""
+    report = {}
+
+    everything = []
+    for endpoint in ENDPOINTS:
+        latencies = sorted(recorder.latencies.get(endpoint, ()))
+        if not latencies:
+            continue
+
+        everything.extend(latencies)
+        statuses = recorder.statuses[endpoint]
+        report[endpoint] = _summarize(latencies, statuses, elapsed)
+
+    if everything:
+        statuses = defaultdict(int)
+        for endpoint_statuses in recorder.statuses.values():
+            for status, count in endpoint_statuses.items():
+                statuses[status] += count
+
+        report['total'] = _summarize(sorted(everything), statuses, elapsed)
+
+    return report
+
+
+def _summarize(latencies, statuses, elapsed):
+    return {
+        'requests': len(latencies),
+        'errors': sum(
+            count
+            for status, count in statuses.items()
+            if status == 'failed' or status >= 400
+        ),
+        'throttled': statuses.get(429, 0),
+        'throughput': round(len(latencies) / elapsed, 2),
+        'mean_ms': round(statistics.fmean(latencies), 2),
+        'p50_ms': round(percentile(latencies, 50), 2),
+        'p95_ms': round(percentile(latencies, 95), 2),
+        'p99_ms': round(percentile(latencies, 99), 2),
+        'max_ms': round(latencies[-1], 2),
+        'statuses': {str(status): count for status, count in statuses.items()},
+    }
+
+
+def run_load(base_url, users, mix, duration, seed=0):
+    """
+    Run one worker per `(username, password)` of `users` against `base_url`
+    for `duration` seconds, and return the report of `summarize`.
+    """
+    recorder = Recorder()
+    deadline = time.monotonic() + duration
+
+    workers = [
+        LoadWorker(
+            base_url,
+            {'username': username, 'password': password},
+            mix,
+            deadline,
+            recorder,
+            seed=seed + index,
+        )
+        for index, (username, password) in enumerate(users)
+    ]
+
+    started = time.monotonic()
+    for worker in workers:
+        worker.start()
+    for worker in workers:
+        worker.join()
+
+    return summarize(recorder, time.monotonic() - started)
@@ -0,0 +1,290 @@
+import json
+import math
+import time
+import random
+import hashlib
+import logging
+
+from pathlib import Path
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+
+import requests
+
+from apps.trip.utils.geo_utils import encode_polyline
+
+
+logger = logging.getLogger(__name__)
+
+EARTH_RADIUS_METERS = 6371008.8
+
+METERS_PER_MILE = 1609.344
+
+# Road distance of a synthesized leg over its great-circle distance
+DETOUR_FACTOR = 1.2
+
+# Average speed of a synthesized leg, miles per hour
+SPEED_MPH = 55
+
+# Spacing of the synthesized geometry points, meters
+POINT_SPACING_METERS = 5000
+
+# ORS step types
+STEP_DEPART = 11
+STEP_ARRIVE = 10
+
+SYNTHESIZE = 'synthesize'
+REPLAY = 'replay'
+RECORD = 'record'
+
+MODES = (SYNTHESIZE, REPLAY, RECORD)
+
+
+def haversine_meters(start, end):
+    """Great-circle distance between two [lon, lat] points."""
+    lon1, lat1, lon2, lat2 = map(math.radians, (*start, *end))
+    a = (
+        math.sin((lat2 - lat1) / 2) ** 2
+        + math.cos(lat1) * math.cos(lat2) * math.sin((lon2 - lon1) / 2) ** 2
+    )
+
+    return 2 * EARTH_RADIUS_METERS * math.asin(math.sqrt(a))
+
+
+def synthesize_directions(coordinates, miles=None):
+    """
+    ORS directions JSON of a route through `coordinates`, [lon, lat] pairs.
+
+    Every leg is a straight line `DETOUR_FACTOR` times longer than the
+    great-circle distance, driven at `SPEED_MPH`, with one depart and one
+    arrive step. With `miles`, the legs are scaled to that total length so
+    a benchmark can pick the trip length regardless of the coordinates.
+    """
+    distances = [
+        haversine_meters(start, end) * DETOUR_FACTOR
+        for start, end in zip(coordinates, coordinates[1:])
+    ]
+
+    if miles is not None:
+        total = sum(distances)
+        meters = miles * METERS_PER_MILE
+        distances = [
+            distance / total * meters if total else meters / len(distances)
+            for distance in distances
+        ]
+
+    geometry = [list(coordinates[0])]
+    way_points = [0]
+    segments = []
+
+    for (start, end), distance in zip(zip(coordinates, coordinates[1:]), distances):
+        points = max(math.ceil(distance / POINT_SPACING_METERS), 1)
+        first = len(geometry) - 1
+
+        geometry.extend(
+            [
+                start[0] + (end[0] - start[0]) * step / points,
+                start[1] + (end[1] - start[1]) * step / points,
+            ]
+            for step in range(1, points + 1)
+        )
+        way_points.append(len(geometry) - 1)
+
+        duration = distance / METERS_PER_MILE / SPEED_MPH * 3600
+        segments.append(
+            {
+                'distance': round(distance, 1),
+                'duration': round(duration, 1),
+                'steps': [
+                    {
+                        'distance': round(distance, 1),
+                        'duration': round(duration, 1),
+                        'type': STEP_DEPART,
+                        'instruction': 'Head to the next waypoint',
+                        'name': '-',
+                        'way_points': [first, len(geometry) - 1],
+                    },
+                    {
+                        'distance': 0.0,
+                        'duration': 0.0,
+                        'type': STEP_ARRIVE,
+                        'instruction': 'Arrive at the waypoint',
+                        'name': '-',
+                        'way_points': [len(geometry) - 1, len(geometry) - 1],
+                    },
+                ],
+            }
+        )
+
+    return {
+        'routes': [
+            {
+                'summary': {
+                    'distance': round(sum(s['distance'] for s in segments), 1),
+                    'duration': round(sum(s['duration'] for s in segments), 1),
+                },
+                'segments': segments,
+                'geometry': encode_polyline(geometry),
+                'way_points': way_points,
+            }
+        ],
+    }
+
+
+def get_fixture_key(path, body):
+    """Fixture name of a directions request, from its path and JSON body."""
+    request = json.dumps({'path': path, 'body': body}, sort_keys=True)
+
+    return hashlib.sha1(request.encode()).hexdigest()
+
+
+def load_fixture(fixtures_dir, key):
+    """`(status, body)` recorded for `key`, or None."""
+    path = Path(fixtures_dir) / f'{key}.json'
+    if not path.exists():
+        return None
+
+    fixture = json.loads(path.read_text())
+
+    return fixture['status'], fixture['response']
+
+
+def save_fixture(fixtures_dir, key, path, body, status, response):
+    fixtures_dir = Path(fixtures_dir)
+    fixtures_dir.mkdir(parents=True, exist_ok=True)
+
+    fixture = {
+        'request': {'path': path, 'body': body},
+        'status': status,
+        'response': response,
+    }
+    (fixtures_dir / f'{key}.json').write_text(json.dumps(fixture, indent=2))
+
+
+def error_body(code, message):
+    """Error body in the ORS format, read by `_request_directions`."""
+    return {'error': {'code': code, 'message': message}}
+
+
+class ORSStandInHandler(BaseHTTPRequestHandler):
+    """
+    Directions endpoint speaking the ORS JSON format, configured by the
+    attributes of the server it runs in, see `build_standin_server`.
+    """
+
+    protocol_version = 'HTTP/1.1'
+
+    def log_message(self, format, *args):
+        logger.debug('%s - %s', self.address_string(), format % args)
+
+    def _send(self, status, body):
+        content = json.dumps(body).encode()
+
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(content)))
+        self.end_headers()
+        self.wfile.write(content)
+
+    def do_POST(self):
+        server = self.server
+        length = int(self.headers.get('Content-Length') or 0)
+
+        try:
+            body = json.loads(self.rfile.read(length) or b'{}')
+        except ValueError:
+            return self._send(400, error_body(2000, 'Invalid JSON body.'))
+
+        if not self.path.startswith('/v2/directions/'):
+            return self._send(404, error_body(2099, f'Unknown path {self.path}.'))
+
+        if server.latency:
+            time.sleep(server.latency)
+
+        if server.error_rate and random.random() < server.error_rate:
+            return self._send(503, error_body(2099, 'Injected failure.'))
+
+        key = get_fixture_key(self.path, body)
+
+        if server.mode == RECORD:
+            return self._send(*self._record(key, body))
+
+        if server.mode == REPLAY:
+            fixture = load_fixture(server.fixtures_dir, key)
+            if fixture is not None:
+                return self._send(*fixture)
+
+            if not server.synthesize_missing:
+                return self._send(
+                    404, error_body(2099, f'No recorded response for {key}.')
+                )
+
+        coordinates = body.get('coordinates')
+        if not isinstance(coordinates, list) or len(coordinates) < 2:
+            return self._send(400, error_body(2003, 'Expected 2 or more coordinates.'))
+
+        self._send(200, synthesize_directions(coordinates, miles=server.miles))
+
+    def _record(self, key, body):
+        """Forward the request upstream and store its answer as a fixture."""
+        server = self.server
+
+        try:
+            response = requests.post(
+                f'{server.upstream}{self.path}',
+                json=body,
+                headers={'Authorization': self.headers.get('Authorization', '')},
+                timeout=30,
+            )
+        except requests.RequestException as e:
+            return 502, error_body(2099, f'Upstream unreachable: {e}')
+
+        status, response_body = response.status_code, response.json()
+
+        # Rate limits and upstream errors are not worth replaying
+        if status < 500 and status != 429:
+            save_fixture(
+                server.fixtures_dir, key, self.path, body, status, response_body
+            )
+
+        return status, response_body
+
+
+def build_standin_server(
+    host='127.0.0.1',
+    port=8080,
+    mode=SYNTHESIZE,
+    fixtures_dir=None,
+    upstream='https://api.openrouteservice.org',
+    miles=None,
+    latency=0,
+    error_rate=0,
+    synthesize_missing=False,
+):
+    """
+    Threaded ORS stand-in, to run with `serve_forever()`; port 0 picks a free
+    port, read back from `server_address`.
+
+    `synthesize` answers every request with `synthesize_directions`.
+    `replay` answers with the fixtures of `fixtures_dir`, and requests not
+    recorded with a 404, or a synthesized route with `synthesize_missing`.
+    `record` forwards requests to `upstream` and saves the answers to
+    `fixtures_dir`. `latency` seconds are added to every answer, and a
+    fraction `error_rate` of them fails with a 503.
+    """
+    if mode not in MODES:
+        raise ValueError(f'mode must be one of {", ".join(MODES)}.')
+
+    if mode in (REPLAY, RECORD) and not fixtures_dir:
+        raise ValueError(f'{mode} needs a fixtures directory.')
+
+    server = ThreadingHTTPServer((host, port), ORSStandInHandler)
+    server.daemon_threads = True
+    server.mode = mode
+    server.fixtures_dir = fixtures_dir
+    server.upstream = upstream.rstrip('/')
+    server.miles = miles
+    server.latency = latency
+    server.error_rate = error_rate
+    server.synthesize_missing = synthesize_missing
+
+    return server
@@ -1,55 +1,547 @@
+import time
+import random
+import asyncio
+import logging
+import weakref
+import threading
+
 from decimal import Decimal
 
+import httpx
 import certifi
+import requests
 import openrouteservice as ors
 
 from django.conf import settings
+from asgiref.sync import sync_to_async
+from urllib3.util import Retry
+from requests.adapters import HTTPAdapter
 from rest_framework.exceptions import APIException
 from openrouteservice.exceptions import ApiError
 
+from apps.trip.utils.geo_utils import decode_polyline, encode_polyline
+from apps.trip.utils.route_cache_utils import route_cache
+from apps.trip.utils.circuit_breaker_utils import CircuitBreaker, RoutingUnavailable
 
-ORS_CLIENT = ors.Client(
-    key=settings.ORS_API_KEY,
-    requests_kwargs={
-        'verify': certifi.where(),
-    },
-)
 
+logger = logging.getLogger(__name__)
 
-def get_ors_route(start_coords, end_coords):
-    """Calls the ORS Directions API for an HGV route and returns key data."""
-    try:
-        coords = [
-            [float(start_coords[0]), float(start_coords[1])],
-            [float(end_coords[0]), float(end_coords[1])],
+ORS_PROFILE = 'driving-hgv'
+
+# Rate limited or failing upstream, retried with backoff
+RETRY_STATUSES = (429, 500, 502, 503, 504)
+
+# Seconds after which the ORS client's own retry loop raises `Timeout`, so
+# that any retry it would add to the session's fails at once
+CLIENT_RETRY_TIMEOUT = 1
+
+_http_stats = {'requests': 0, 'retries': 0, 'exhausted': 0}
+_http_stats_lock = threading.Lock()
+
+
+class RoutingFailed(ValueError):
+    """ORS could not be reached or failed upstream, a retry may succeed."""
+
+
+def _count(name, amount=1):
+    with _http_stats_lock:
+        _http_stats[name] += amount
+
+
+def get_ors_timeout():
+    """`(connect, read)` timeouts applied to every ORS call, in seconds."""
+    return settings.ORS_CONNECT_TIMEOUT, settings.ORS_READ_TIMEOUT
+
+
+def get_retry_delay(retry, retry_after=None):
+    """
+    Seconds to wait before the `retry`-th retry, 1-based. Exponential backoff
+    with random jitter so concurrent callers do not retry in lockstep, or the
+    `Retry-After` given by ORS, capped at `ORS_RETRY_AFTER_MAX` so a long hint
+    does not hold the worker past its timeouts.
+    """
+    if retry_after is not None:
+        return min(retry_after, settings.ORS_RETRY_AFTER_MAX)
+
+    return settings.ORS_RETRY_BACKOFF * 2 ** (retry - 1) + random.uniform(
+        0, settings.ORS_RETRY_JITTER
+    )
+
+
+class ORSRetry(Retry):
+    """urllib3 retries waiting at most `ORS_RETRY_AFTER_MAX` on `Retry-After`."""
+
+    def sleep_for_retry(self, response):
+        retry_after = self.get_retry_after(response)
+        if retry_after is None:
+            return False
+
+        time.sleep(get_retry_delay(0, retry_after))
+        return True
+
+
+class ORSHTTPAdapter(HTTPAdapter):
+    """Keep-alive pool to ORS that counts requests and retries."""
+
+    def send(self, request, **kwargs):
+        _count('requests')
+
+        try:
+            response = super().send(request, **kwargs)
+        except requests.exceptions.RetryError:
+            _count('retries', self.max_retries.total)
+            _count('exhausted')
+            raise
+
+        retries = getattr(response.raw, 'retries', None)
+        if retries is not None and retries.history:
+            _count('retries', len(retries.history))
+
+        return response
+
+    def pool_stats(self):
+        pools = [
+            self.poolmanager.pools.get(key) for key in self.poolmanager.pools.keys()
         ]
+        pools = [pool for pool in pools if pool is not None]
+
+        return (
+            sum(pool.num_requests for pool in pools),
+            sum(pool.num_connections for pool in pools),
+        )
+
+
+def build_ors_session():
+    """
+    `requests` session of the ORS client, with a keep-alive pool of
+    `ORS_POOL_MAXSIZE` connections and at most `ORS_MAX_RETRIES` retries on
+    connection errors and `RETRY_STATUSES`, backed off with jitter.
+    """
+    retry = ORSRetry(
+        total=settings.ORS_MAX_RETRIES,
+        status_forcelist=RETRY_STATUSES,
+        # Directions requests are POSTs but have no side effects
+        allowed_methods=None,
+        backoff_factor=settings.ORS_RETRY_BACKOFF,
+        backoff_jitter=settings.ORS_RETRY_JITTER,
+        backoff_max=settings.ORS_RETRY_AFTER_MAX,
+        respect_retry_after_header=True,
+    )
+    adapter = ORSHTTPAdapter(
+        pool_connections=1,
+        pool_maxsize=settings.ORS_POOL_MAXSIZE,
+        max_retries=retry,
+    )
+
+    session = requests.Session()
+    session.mount('https://', adapter)
+    session.mount('http://', adapter)
+
+    return session
+
+
+class ORSClient(ors.Client):
+    """
+    `ors.Client` on a given `requests` session. The session is the only layer
+    retrying: the client's own loop, which retries 429s and 503s until a 60s
+    `retry_timeout` with uncapped sleeps, is turned off.
+    """
+
+    def __init__(self, session, **kwargs):
+        super().__init__(
+            retry_timeout=CLIENT_RETRY_TIMEOUT, retry_over_query_limit=False, **kwargs
+        )
+        # The client opens its own session and takes none as an argument
+        self._session = session
+
+    @property
+    def session(self):
+        return self._session
+
+
+def build_ors_client():
+    """ORS client of `ORS_BASE_URL` on the tuned session."""
+    return ORSClient(
+        build_ors_session(),
+        key=settings.ORS_API_KEY,
+        base_url=settings.ORS_BASE_URL,
+        timeout=get_ors_timeout(),
+        requests_kwargs={
+            'verify': certifi.where(),
+        },
+    )
+
+
+ORS_CLIENT = build_ors_client()
+
+
+def ors_http_stats():
+    """
+    Counters of the ORS HTTP clients. `connections` are the sockets opened
+    by the sync pool, every other request of that pool reused one.
+    """
+    with _http_stats_lock:
+        stats = dict(_http_stats)
+
+    adapter = ORS_CLIENT.session.get_adapter(settings.ORS_BASE_URL)
+    pool_requests, connections = adapter.pool_stats()
+
+    stats['connections'] = connections
+    stats['reused'] = max(pool_requests - connections, 0)
+    stats['reuse_ratio'] = (
+        round(stats['reused'] / pool_requests, 4) if pool_requests else 0.0
+    )
+
+    return stats
+
+
+ORS_BREAKER = CircuitBreaker('ors')
+
+# One pooled async client per event loop, an httpx client is bound to its loop
+_async_clients = weakref.WeakKeyDictionary()
+
+
+def build_route(payload, stale=False):
+    """
+    Convert a raw ORS route payload into the dict used by the planner,
+    `stale` when it is an expired cache entry served during an outage.
+    """
+    distance_miles = Decimal(payload['distance']) * settings.METERS_TO_MILES
+    duration_hours = Decimal(payload['duration']) * settings.SECONDS_TO_HOURS
+
+    return {
+        'distance_miles': distance_miles,
+        'duration_hours': duration_hours,
+        'geometry': payload['geometry'],
+        'segments': payload['segments'],
+        'stale': stale,
+    }
+
+
+def _request_directions(coordinates, profile):
+    """Calls the ORS Directions API and returns the first route found."""
+    if not ORS_BREAKER.allow():
+        raise RoutingUnavailable()
+
+    try:
+        coords = [[float(c[0]), float(c[1])] for c in coordinates]
         route = ORS_CLIENT.directions(
             coordinates=coords,
-            profile='driving-hgv',
+            profile=profile,
             units='m',
             instructions=True,
             geometry_simplify=False,
         )
-        route_info = route['routes'][0]
 
-        distance_miles = (
-            Decimal(route_info['summary']['distance']) * settings.METERS_TO_MILES
-        )
-        duration_hours = (
-            Decimal(route_info['summary']['duration']) * settings.SECONDS_TO_HOURS
-        )
-
-        return {
-            'distance_miles': distance_miles,
-            'duration_hours': duration_hours,
-            'geometry': route_info['geometry'],
-            'segments': route_info['segments'][0]['steps'],
-        }
     except ApiError as e:
+        if e.status in RETRY_STATUSES:
+            ORS_BREAKER.record_failure()
+            logger.warning('ORS routing error: %s', e)
+
+            raise RoutingFailed(f'Failed to get route from ORS: {e}')
+
+        # ORS answered, the request itself was rejected
+        ORS_BREAKER.record_success()
         # ORS library raises ApiError with the response data
         raise APIException(e.message['error']['message'])
 
     except Exception as e:
-        print(f'ORS Routing Error: {e}')
+        ORS_BREAKER.record_failure()
+        logger.warning('ORS routing error: %s', e)
+
+        raise RoutingFailed(f'Failed to get route from ORS: {e}')
+
+    ORS_BREAKER.record_success()
+
+    return route['routes'][0]
+
+
+def get_async_client():
+    """Pooled ORS client of the running event loop."""
+    loop = asyncio.get_running_loop()
+    client = _async_clients.get(loop)
+
+    if client is None:
+        connect_timeout, read_timeout = get_ors_timeout()
+        client = httpx.AsyncClient(
+            base_url=settings.ORS_BASE_URL,
+            headers={'Authorization': settings.ORS_API_KEY},
+            timeout=httpx.Timeout(read_timeout, connect=connect_timeout),
+            verify=certifi.where(),
+            limits=httpx.Limits(
+                max_connections=settings.ORS_ASYNC_MAX_CONNECTIONS,
+                max_keepalive_connections=settings.ORS_ASYNC_MAX_CONNECTIONS,
+            ),
+        )
+        _async_clients[loop] = client
+
+    return client
+
+
+async def _apost_with_retries(url, payload):
+    """POST on the async client, retried like the sync session."""
+    client = get_async_client()
+    retry = 0
+    _count('requests')
+
+    while True:
+        try:
+            response = await client.post(url, json=payload)
+        except httpx.TransportError:
+            if retry >= settings.ORS_MAX_RETRIES:
+                _count('exhausted')
+                raise
+            retry_after = None
+        else:
+            if response.status_code not in RETRY_STATUSES:
+                return response
+
+            if retry >= settings.ORS_MAX_RETRIES:
+                _count('exhausted')
+                return response
+
+            retry_after = response.headers.get('Retry-After', '')
+            retry_after = float(retry_after) if retry_after.isdigit() else None
+
+        retry += 1
+        _count('retries')
+        await asyncio.sleep(get_retry_delay(retry, retry_after))
+
+
+async def _arequest_directions(coordinates, profile):
+    """Async counterpart of `_request_directions`, on the pooled client."""
+    if not ORS_BREAKER.allow():
+        raise RoutingUnavailable()
+
+    try:
+        coords = [[float(c[0]), float(c[1])] for c in coordinates]
+        response = await _apost_with_retries(
+            f'/v2/directions/{profile}/json',
+            {
+                'coordinates': coords,
+                'units': 'm',
+                'instructions': True,
+                'geometry_simplify': False,
+            },
+        )
+        if response.status_code in RETRY_STATUSES:
+            raise httpx.HTTPStatusError(
+                f'ORS responded {response.status_code}',
+                request=response.request,
+                response=response,
+            )
+
+        body = response.json()
+
+    except Exception as e:
+        ORS_BREAKER.record_failure()
+        logger.warning('ORS routing error: %s', e)
+
+        raise RoutingFailed(f'Failed to get route from ORS: {e}')
+
+    ORS_BREAKER.record_success()
+
+    if response.status_code != 200:
+        error = body.get('error') if isinstance(body, dict) else None
+        message = error.get('message') if isinstance(error, dict) else error
+
+        raise APIException(message or f'ORS responded {response.status_code}')
+
+    return body['routes'][0]
+
+
+def _route_payload(route_info):
+    return {
+        'distance': route_info['summary']['distance'],
+        'duration': route_info['summary']['duration'],
+        'geometry': route_info['geometry'],
+        'segments': route_info['segments'][0]['steps'],
+    }
+
+
+def _leg_payloads(route_info):
+    geometry = decode_polyline(route_info['geometry'])
+    way_points = route_info['way_points']
+
+    payloads = []
+    for index, segment in enumerate(route_info['segments']):
+        start, end = way_points[index], way_points[index + 1]
+        payloads.append(
+            {
+                'distance': segment['distance'],
+                'duration': segment['duration'],
+                'geometry': encode_polyline(geometry[start : end + 1]),
+                'segments': segment['steps'],
+            }
+        )
+
+    return payloads
+
+
+def fetch_ors_route(start_coords, end_coords, profile=ORS_PROFILE):
+    """Returns the raw route payload between two coordinates."""
+    return _route_payload(_request_directions([start_coords, end_coords], profile))
+
+
+def fetch_ors_routes(coordinates, profile=ORS_PROFILE):
+    """
+    Returns one raw route payload per leg of a multi-waypoint route, using a
+    single ORS request. Each leg gets its own segment summary and the slice of
+    the route geometry between its two waypoints.
+    """
+    return _leg_payloads(_request_directions(coordinates, profile))
+
+
+async def afetch_ors_route(start_coords, end_coords, profile=ORS_PROFILE):
+    route_info = await _arequest_directions([start_coords, end_coords], profile)
+
+    return _route_payload(route_info)
+
+
+async def afetch_ors_routes(coordinates, profile=ORS_PROFILE):
+    return _leg_payloads(await _arequest_directions(coordinates, profile))
+
+
+def _stale_payloads(legs, profile):
+    """Expired cached payloads of `legs`, or None unless all are cached."""
+    payloads = [route_cache.get(start, end, profile, stale=True) for start, end in legs]
+
+    return None if None in payloads else payloads
+
+
+def _use_stale_payloads(payloads, missing, stale_payloads, error):
+    """Fill the missing legs with stale payloads, or re-raise `error`."""
+    if stale_payloads is None:
+        raise error
+
+    logger.warning(
+        'Serving %d stale routes after a routing failure: %s', len(missing), error
+    )
+    for index, payload in zip(missing, stale_payloads):
+        payloads[index] = payload
+
+
+def get_ors_route(start_coords, end_coords, profile=ORS_PROFILE):
+    """
+    Returns an HGV route between two coordinates, served from the route
+    cache when the same lane has been requested before.
+    """
+    return get_ors_routes([start_coords, end_coords], profile)[0]
+
+
+def get_ors_routes(coordinates, profile=ORS_PROFILE):
+    """
+    Returns the HGV route of every leg between consecutive coordinates.
+
+    Cached legs are reused; when more than one leg is missing, the whole
+    route is fetched with a single multi-waypoint request. When ORS fails or
+    the circuit breaker is open, missing legs are served from expired cache
+    entries if they all have one, and these routes are flagged `stale`.
+    """
+    legs = list(zip(coordinates, coordinates[1:]))
+    payloads = [route_cache.get(start, end, profile) for start, end in legs]
+    missing = [index for index, payload in enumerate(payloads) if payload is None]
+    stale = False
+
+    try:
+        if len(missing) == 1:
+            start, end = legs[missing[0]]
+            payloads[missing[0]] = fetch_ors_route(start, end, profile)
+
+        elif missing:
+            payloads = fetch_ors_routes(coordinates, profile)
+
+    except (RoutingUnavailable, ValueError) as e:
+        stale_payloads = _stale_payloads([legs[index] for index in missing], profile)
+        _use_stale_payloads(payloads, missing, stale_payloads, e)
+        stale = True
+
+    else:
+        for index in missing:
+            start, end = legs[index]
+            route_cache.set(start, end, profile, payloads[index])
+
+    return [
+        build_route(payload, stale=stale and index in missing)
+        for index, payload in enumerate(payloads)
+    ]
+
+
+async def aget_ors_routes(coordinates, profile=ORS_PROFILE):
+    """
+    Async counterpart of `get_ors_routes`. The event loop is only held by the
+    ORS requests, the route cache is read and written from a worker thread.
+    """
+    legs = list(zip(coordinates, coordinates[1:]))
+    cache_get = sync_to_async(route_cache.get)
+    payloads = [await cache_get(start, end, profile) for start, end in legs]
+    missing = [index for index, payload in enumerate(payloads) if payload is None]
+    stale = False
+
+    try:
+        if len(missing) == 1:
+            start, end = legs[missing[0]]
+            payloads[missing[0]] = await afetch_ors_route(start, end, profile)
+
+        elif missing:
+            payloads = await afetch_ors_routes(coordinates, profile)
+
+    except (RoutingUnavailable, ValueError) as e:
+        stale_payloads = await sync_to_async(_stale_payloads)(
+            [legs[index] for index in missing], profile
+        )
+        _use_stale_payloads(payloads, missing, stale_payloads, e)
+        stale = True
+
+    else:
+        for index in missing:
+            start, end = legs[index]
+            await sync_to_async(route_cache.set)(start, end, profile, payloads[index])
+
+    return [
+        build_route(payload, stale=stale and index in missing)
+        for index, payload in enumerate(payloads)
+    ]
+
+
+def get_ors_leg_routes(legs, fetch_all, profile=ORS_PROFILE):
+    """
+    Returns the HGV route of each of `legs`, `(start, end)` pairs routed
+    independently, or the exception raised while getting it.
+
+    The legs missing from the route cache are fetched with
+    `fetch_all(fetch, legs)`, returning the raw payload or the exception of
+    each leg, e.g. from a thread pool. The route cache is only read and
+    written by the calling thread, so pool threads never write to the
+    database, which SQLite would refuse while another write is running.
+    """
+    payloads = [route_cache.get(start, end, profile) for start, end in legs]
+    missing = [index for index, payload in enumerate(payloads) if payload is None]
+
+    fetched = fetch_all(
+        lambda leg: fetch_ors_route(*leg, profile=profile),
+        [legs[index] for index in missing],
+    )
+
+    routes = [None if payload is None else build_route(payload) for payload in payloads]
+
+    for index, result in zip(missing, fetched):
+        start, end = legs[index]
+
+        if not isinstance(result, Exception):
+            route_cache.set(start, end, profile, result)
+            routes[index] = build_route(result)
+            continue
+
+        stale_payloads = None
+        if isinstance(result, (RoutingUnavailable, ValueError)):
+            stale_payloads = _stale_payloads([(start, end)], profile)
+
+        try:
+            _use_stale_payloads(payloads, [index], stale_payloads, result)
+        except Exception as e:
+            routes[index] = e
+        else:
+            routes[index] = build_route(payloads[index], stale=True)
 
-        raise ValueError(f'Failed to get route from ORS: {e}')
+    return routes
@@ -0,0 +1,48 @@
+import hashlib
+
+from django.conf import settings
+from django.core.cache import cache
+
+
+TRIPS_VERSION_KEY = 'trips:version'
+
+
+def get_trips_version():
+    """Current generation of the cached trip responses."""
+    version = cache.get(TRIPS_VERSION_KEY)
+    if version is None:
+        # Only sets the counter when no other worker did in the meantime
+        cache.add(TRIPS_VERSION_KEY, 1, timeout=None)
+        version = cache.get(TRIPS_VERSION_KEY, 1)
+
+    return version
+
+
+def bump_trips_version():
+    """
+    Invalidate every cached trip response by moving to a new generation.
+
+    Called by the `Trip` signals, and explicitly after `bulk_create` which
+    sends none. Entries of older generations are left to expire.
+    """
+    try:
+        cache.incr(TRIPS_VERSION_KEY)
+    except ValueError:
+        cache.add(TRIPS_VERSION_KEY, 1, timeout=None)
+        cache.incr(TRIPS_VERSION_KEY)
+
+
+def make_response_key(name, request):
+    """Cache key of a response, per user, per query and per generation."""
+    user = request.user.pk if request.user.is_authenticated else 'anon'
+    url = hashlib.sha1(request.build_absolute_uri().encode()).hexdigest()
+
+    return f'trips:{name}:{get_trips_version()}:{user}:{url}'
+
+
+def get_cached_response(key):
+    return cache.get(key)
+
+
+def cache_response(key, value):
+    cache.set(key, value, timeout=settings.TRIP_RESPONSE_CACHE_TTL)
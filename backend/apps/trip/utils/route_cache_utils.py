@@ -0,0 +1,245 @@
+import time
+import threading
+
+from datetime import timedelta
+from collections import OrderedDict, defaultdict
+
+from django.conf import settings
+from django.utils import timezone
+from django.db.models import F
+
+from apps.trip.models.route_cache_models import RouteCache
+
+
+def snap_coordinates(coords, precision=None):
+    """Round a (lon, lat) pair so nearby requests share a cache entry."""
+    if precision is None:
+        precision = settings.ROUTE_CACHE_PRECISION
+
+    return ','.join(f'{round(float(c), precision):.{precision}f}' for c in coords)
+
+
+def make_cache_key(start_coords, end_coords, profile):
+    return f'{profile}:{snap_coordinates(start_coords)};{snap_coordinates(end_coords)}'
+
+
+class RouteCacheStore:
+    """
+    Two-tier cache for raw ORS route payloads.
+
+    The first tier is a per-process LRU, the second one is the `RouteCache`
+    table shared by every worker. Both tiers expire entries after
+    `ROUTE_CACHE_TTL` seconds and keep at most `ROUTE_CACHE_MEMORY_SIZE` and
+    `ROUTE_CACHE_MAX_ENTRIES` entries respectively. Expired rows stay in the
+    table until `ROUTE_CACHE_STALE_TTL` to be served during ORS outages.
+
+    Table hits are counted in memory and written in one batch, and the table
+    is trimmed once per batch of stores, every `ROUTE_CACHE_BATCH_SIZE` events
+    or `ROUTE_CACHE_FLUSH_INTERVAL` seconds, so lookups stay read-only. The
+    table may meanwhile exceed its size limit by a batch per worker.
+    """
+
+    def __init__(self):
+        self._memory = OrderedDict()
+        self._lock = threading.Lock()
+        # Row pk to table hits not written yet
+        self._pending_hits = defaultdict(int)
+        self._stores_since_evict = 0
+        self._flushed_at = time.monotonic()
+        self._evicted_at = time.monotonic()
+        self._stats = {
+            'memory_hits': 0,
+            'db_hits': 0,
+            'misses': 0,
+            'stores': 0,
+            'evictions': 0,
+        }
+
+    def _count(self, name, amount=1):
+        with self._lock:
+            self._stats[name] += amount
+
+    def stats(self) -> dict:
+        with self._lock:
+            stats = dict(self._stats)
+            stats['memory_size'] = len(self._memory)
+
+        lookups = stats['memory_hits'] + stats['db_hits'] + stats['misses']
+        hits = stats['memory_hits'] + stats['db_hits']
+        stats['hit_ratio'] = round(hits / lookups, 4) if lookups else 0.0
+
+        return stats
+
+    def clear(self, persistent=False):
+        with self._lock:
+            self._memory.clear()
+            self._pending_hits.clear()
+            self._stores_since_evict = 0
+            for name in self._stats:
+                self._stats[name] = 0
+
+        if persistent:
+            RouteCache.objects.all().delete()
+
+    def _memory_get(self, key, now):
+        with self._lock:
+            entry = self._memory.get(key)
+            if entry is None:
+                return None
+
+            payload, expires_at = entry
+            if expires_at <= now:
+                del self._memory[key]
+                return None
+
+            self._memory.move_to_end(key)
+            self._stats['memory_hits'] += 1
+
+            return payload
+
+    def _memory_set(self, key, payload, expires_at):
+        with self._lock:
+            self._memory[key] = (payload, expires_at)
+            self._memory.move_to_end(key)
+
+            while len(self._memory) > settings.ROUTE_CACHE_MEMORY_SIZE:
+                self._memory.popitem(last=False)
+
+    def get(self, start_coords, end_coords, profile, stale=False):
+        """
+        Return the cached payload for a lane, or None on a miss. With `stale`
+        expired rows are served too, as a fallback when ORS is unavailable.
+        """
+        if not settings.ROUTE_CACHE_ENABLED:
+            return None
+
+        key = make_cache_key(start_coords, end_coords, profile)
+        now = timezone.now()
+
+        payload = self._memory_get(key, now)
+        if payload is not None:
+            return payload
+
+        ttl = timedelta(seconds=settings.ROUTE_CACHE_TTL)
+        rows = RouteCache.objects.filter(cache_key=key)
+        if not stale:
+            rows = rows.filter(updated_at__gt=now - ttl)
+
+        row = rows.only(
+            'distance_meters', 'duration_seconds', 'geometry', 'segments', 'updated_at'
+        ).first()
+        if row is None:
+            self._count('misses')
+            return None
+
+        self._record_hit(row.pk)
+
+        payload = {
+            'distance': row.distance_meters,
+            'duration': row.duration_seconds,
+            'geometry': row.geometry,
+            'segments': row.segments,
+        }
+        # An expired row must not be served as fresh from memory
+        if row.updated_at > now - ttl:
+            self._memory_set(key, payload, row.updated_at + ttl)
+
+        return payload
+
+    def set(self, start_coords, end_coords, profile, payload):
+        """Store a raw ORS payload in both tiers."""
+        if not settings.ROUTE_CACHE_ENABLED:
+            return
+
+        key = make_cache_key(start_coords, end_coords, profile)
+        now = timezone.now()
+
+        RouteCache.objects.update_or_create(
+            cache_key=key,
+            defaults={
+                'profile': profile,
+                'start_coordinates': snap_coordinates(start_coords),
+                'end_coordinates': snap_coordinates(end_coords),
+                'distance_meters': payload['distance'],
+                'duration_seconds': payload['duration'],
+                'geometry': payload['geometry'],
+                'segments': payload['segments'],
+                'last_used_at': now,
+            },
+        )
+        self._memory_set(
+            key, payload, now + timedelta(seconds=settings.ROUTE_CACHE_TTL)
+        )
+        with self._lock:
+            self._stats['stores'] += 1
+            self._stores_since_evict += 1
+            due = (
+                self._stores_since_evict >= settings.ROUTE_CACHE_BATCH_SIZE
+                or time.monotonic() - self._evicted_at
+                >= settings.ROUTE_CACHE_FLUSH_INTERVAL
+            )
+            if due:
+                self._stores_since_evict = 0
+                self._evicted_at = time.monotonic()
+
+        if due:
+            self._evict(now)
+
+    def _record_hit(self, pk):
+        with self._lock:
+            self._stats['db_hits'] += 1
+            self._pending_hits[pk] += 1
+            due = (
+                len(self._pending_hits) >= settings.ROUTE_CACHE_BATCH_SIZE
+                or time.monotonic() - self._flushed_at
+                >= settings.ROUTE_CACHE_FLUSH_INTERVAL
+            )
+
+        if due:
+            self.flush_hits()
+
+    def flush_hits(self):
+        """
+        Write the pending hit counts, one UPDATE per distinct count. Rows
+        are marked used at the flush, precise enough for the LRU trimming.
+        """
+        with self._lock:
+            hits, self._pending_hits = self._pending_hits, defaultdict(int)
+            self._flushed_at = time.monotonic()
+
+        groups = defaultdict(list)
+        for pk, count in hits.items():
+            groups[count].append(pk)
+
+        now = timezone.now()
+        for count, pks in groups.items():
+            RouteCache.objects.filter(pk__in=pks).update(
+                hit_count=F('hit_count') + count,
+                last_used_at=now,
+            )
+
+    def _evict(self, now):
+        """
+        Drop rows past `ROUTE_CACHE_STALE_TTL` and trim the table down to its
+        size limit. Expired rows are kept until then for the stale fallback.
+        """
+        max_age = timedelta(
+            seconds=max(settings.ROUTE_CACHE_TTL, settings.ROUTE_CACHE_STALE_TTL)
+        )
+        evicted, _ = RouteCache.objects.filter(updated_at__lte=now - max_age).delete()
+
+        overflow = RouteCache.objects.count() - settings.ROUTE_CACHE_MAX_ENTRIES
+        if overflow > 0:
+            stale_ids = list(
+                RouteCache.objects.order_by('last_used_at').values_list(
+                    'pk', flat=True
+                )[:overflow]
+            )
+            deleted, _ = RouteCache.objects.filter(pk__in=stale_ids).delete()
+            evicted += deleted
+
+        if evicted:
+            self._count('evictions', evicted)
+
+
+route_cache = RouteCacheStore()
@@ -0,0 +1,146 @@
+import time
+import uuid
+import asyncio
+
+from django.conf import settings
+from django.core.cache import cache
+
+
+POLL_INTERVAL = 0.05
+
+RUNNING = 'running'
+DONE = 'done'
+FAILED = 'failed'
+
+
+def _outcomes(outcome, value, token):
+    yield outcome, value, token
+
+    if outcome == FAILED:
+        # The exception could not be pickled, waiting callers get its message
+        yield FAILED, Exception(str(value)), token
+
+
+def _finish(key, outcome, value, token):
+    """Publish the outcome of a flight to the callers waiting on it."""
+    for state in _outcomes(outcome, value, token):
+        try:
+            cache.set(key, state, timeout=settings.TRIP_FLIGHT_RESULT_TTL)
+            return
+        except Exception:
+            continue
+
+
+async def _afinish(key, outcome, value, token):
+    for state in _outcomes(outcome, value, token):
+        try:
+            await cache.aset(key, state, timeout=settings.TRIP_FLIGHT_RESULT_TTL)
+            return
+        except Exception:
+            continue
+
+
+def _release(key, token):
+    """
+    Delete the key of a failed flight, unless its claim expired and another
+    caller holds the key by now.
+    """
+    state = cache.get(key)
+    if state is not None and state[2] == token:
+        cache.delete(key)
+
+
+async def _arelease(key, token):
+    state = await cache.aget(key)
+    if state is not None and state[2] == token:
+        await cache.adelete(key)
+
+
+def single_flight(key, compute, dump, load):
+    """
+    Run `compute()` once for all the concurrent callers sharing `key`.
+
+    The first caller claims the key with an atomic `cache.add`, which the
+    shared cache makes visible to every thread and worker; production
+    settings refuse a process-local cache for that reason. It publishes
+    `dump(result)`, and the others poll the key until then and return
+    `load()` of it, or raise the exception raised by `compute`. A result is
+    kept for `TRIP_FLIGHT_RESULT_TTL` seconds so a late duplicate gets it
+    too; a failure only for one poll of the waiting callers, then the key is
+    released so the next caller computes again. A caller that waited
+    `TRIP_FLIGHT_TIMEOUT` seconds, or for which `load` returns None, computes
+    on its own.
+    """
+    key = f'flight:{key}'
+    deadline = time.monotonic() + settings.TRIP_FLIGHT_TIMEOUT
+
+    token = uuid.uuid4().hex
+
+    while time.monotonic() < deadline:
+        running = (RUNNING, None, token)
+        if cache.add(key, running, timeout=settings.TRIP_FLIGHT_TIMEOUT):
+            try:
+                result = compute()
+            except Exception as e:
+                _finish(key, FAILED, e, token)
+                time.sleep(POLL_INTERVAL)
+                _release(key, token)
+                raise
+
+            _finish(key, DONE, dump(result), token)
+            return result
+
+        state = cache.get(key)
+        if state is not None:
+            outcome, value, _ = state
+            if outcome == DONE:
+                result = load(value)
+                # None when the published result is gone, e.g. deleted since
+                if result is not None:
+                    return result
+
+                break
+            if outcome == FAILED:
+                raise value
+
+        time.sleep(POLL_INTERVAL)
+
+    return compute()
+
+
+async def asingle_flight(key, compute, dump, load):
+    """Async counterpart of `single_flight`, `compute` and `load` awaitable."""
+    key = f'flight:{key}'
+    deadline = time.monotonic() + settings.TRIP_FLIGHT_TIMEOUT
+
+    token = uuid.uuid4().hex
+
+    while time.monotonic() < deadline:
+        running = (RUNNING, None, token)
+        if await cache.aadd(key, running, timeout=settings.TRIP_FLIGHT_TIMEOUT):
+            try:
+                result = await compute()
+            except Exception as e:
+                await _afinish(key, FAILED, e, token)
+                await asyncio.sleep(POLL_INTERVAL)
+                await _arelease(key, token)
+                raise
+
+            await _afinish(key, DONE, dump(result), token)
+            return result
+
+        state = await cache.aget(key)
+        if state is not None:
+            outcome, value, _ = state
+            if outcome == DONE:
+                result = await load(value)
+                if result is not None:
+                    return result
+
+                break
+            if outcome == FAILED:
+                raise value
+
+        await asyncio.sleep(POLL_INTERVAL)
+
+    return await compute()
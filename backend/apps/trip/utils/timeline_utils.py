@@ -0,0 +1,108 @@
+from datetime import timedelta
+
+
+STATUS_MAP = {
+    'DRIVING': 'DRIVING',
+    'PICKUP': 'ON_DUTY',
+    'DROPOFF': 'ON_DUTY',
+    'FUEL': 'ON_DUTY',
+    'REST': 'ON_DUTY',
+    'SLEEPER': 'SLEEPER_BERTH',
+}
+
+ACTIVITY_MAP = {
+    'DRIVING': 'Driving - {}',
+    'PICKUP': 'Pickup at {}',
+    'DROPOFF': 'Dropoff at {}',
+    'FUEL': 'Fueling at {}',
+    'REST': 'Rest Break - {}',
+    'SLEEPER': 'Sleeper Berth - {}',
+}
+
+TIMELINE_FIELDS = ('time', 'duty_hrs', 'status', 'activity', 'duration_hrs')
+
+MICROSECOND = timedelta(microseconds=1)
+
+MICROSECONDS_PER_HOUR = 3600 * 1_000_000
+
+
+def get_status_type(stop_type):
+    """
+    Convert stop type to ELD status.
+    """
+    return STATUS_MAP.get(stop_type, 'OFF_DUTY')
+
+
+def get_activity_description(stop_type, location_name):
+    activity = ACTIVITY_MAP.get(stop_type)
+
+    return activity.format(location_name) if activity else location_name
+
+
+def build_timeline(entries, unit):
+    """
+    Build the compact duty-status timeline of a trip.
+
+    `entries` yields `(stop_type, location_name, arrival, duration)` in stop
+    order, with the duration counted in `unit` per hour. Durations are summed
+    in their own unit, so the cumulative duty hours carry no rounding error.
+    Each row is a list ordered as `TIMELINE_FIELDS`.
+    """
+    timeline = []
+    cumulative_duty = 0
+
+    for stop_type, location_name, arrival, duration in entries:
+        status_type = get_status_type(stop_type)
+
+        # Only on-duty activities count towards the duty hours
+        if status_type in ('DRIVING', 'ON_DUTY'):
+            cumulative_duty += duration
+
+        timeline.append(
+            [
+                arrival.isoformat(),
+                cumulative_duty / unit,
+                status_type,
+                get_activity_description(stop_type, location_name),
+                duration / unit,
+            ]
+        )
+
+    return timeline
+
+
+def timeline_from_stops(stops, rules):
+    """Timeline of a freshly planned trip, from the planner stops."""
+    return build_timeline(
+        (
+            (
+                stop['stop_type'],
+                stop['location_name'],
+                stop['estimated_arrival'],
+                stop['duration_ticks'],
+            )
+            for stop in stops
+        ),
+        rules.ticks_per_hour,
+    )
+
+
+def timeline_from_routes(trip_routes):
+    """Timeline of a stored trip, from its `TripRoute` rows."""
+    return build_timeline(
+        (
+            (
+                route.stop_type,
+                route.location_name,
+                route.estimated_arrival,
+                (route.estimated_departure - route.estimated_arrival) // MICROSECOND,
+            )
+            for route in trip_routes
+        ),
+        MICROSECONDS_PER_HOUR,
+    )
+
+
+def expand_timeline(timeline):
+    """Turn stored timeline rows back into the entries served by the API."""
+    return [dict(zip(TIMELINE_FIELDS, row)) for row in timeline]
@@ -1,19 +1,49 @@
-import json
+import hashlib
+import threading
 
-from decimal import Decimal, getcontext
+from decimal import Decimal
 from datetime import datetime, timedelta
+from concurrent.futures import ThreadPoolExecutor, ProcessPoolExecutor
+
+import django
 
 from django.db import transaction
 from django.conf import settings
+from asgiref.sync import sync_to_async
 from django.utils import timezone
 
-from apps.trip.utils.ors_utils import get_ors_route
+from apps.trip.utils.geo_utils import (
+    RouteIndex,
+    simplify_route,
+    decode_polyline,
+    encode_polyline,
+)
+from apps.trip.utils.hos_utils import DutyClock, get_hos_rules
+from apps.trip.utils.ors_utils import (
+    ORS_PROFILE,
+    get_ors_route,
+    get_ors_routes,
+    aget_ors_routes,
+    get_ors_leg_routes,
+)
 from apps.trip.models.trip_models import Trip
+from apps.trip.utils.timeline_utils import timeline_from_stops
 from apps.trip.models.trip_log_models import TripLog
+from apps.trip.utils.route_cache_utils import make_cache_key
 from apps.trip.models.trip_route_models import TripRoute
+from apps.trip.utils.single_flight_utils import single_flight, asingle_flight
+from apps.trip.utils.response_cache_utils import bump_trips_version
+
 
+# Bounded pool used to fetch the distinct legs of a batch concurrently
+ROUTE_EXECUTOR = ThreadPoolExecutor(
+    max_workers=max(settings.ROUTE_FETCH_WORKERS, 1),
+    thread_name_prefix='trip-route',
+)
 
-getcontext().prec = 50
+# Process pool running the planner of batch calculations, created on first use
+_planner_pool = None
+_planner_pool_lock = threading.Lock()
 
 
 def parse_coordinates(coord_string):
@@ -31,16 +61,29 @@ class ELDTripPlanner:
     """
     Service for generating FMCSA-compliant trip routes with automatic stop planning.
     Handles HOS rules for property-carrying drivers (70hrs/8days).
+
+    Planning runs on the fixed-point integers of the compiled `HOSRules`;
+    values are converted back to Decimal hours only when the plan is returned.
     """
 
-    def __init__(self, get_ors_route_func):
+    def __init__(
+        self,
+        get_ors_route_func,
+        get_ors_routes_func=None,
+        rules=None,
+    ):
         """
         Initialize planner with ORS route function.
 
         Args:
             get_ors_route_func: Function to call ORS API
+            get_ors_routes_func: Optional function returning every leg of a
+                multi-waypoint route from a single ORS call
+            rules: HOSRules to plan with, compiled from settings by default
         """
         self.get_ors_route = get_ors_route_func
+        self.get_ors_routes = get_ors_routes_func
+        self.rules = rules or get_hos_rules()
 
     def create_trip_plan(
         self,
@@ -59,16 +102,22 @@ class ELDTripPlanner:
             dict with trip data, trip_routes, and daily_logs
         """
         # Validate cycle hours
-        available_cycle = settings.MAX_CYCLE_HOURS - current_cycle_used
-        if available_cycle <= 0:
+        cycle_used = self.rules.hours_to_ticks(current_cycle_used)
+        if self.rules.max_cycle - cycle_used <= 0:
             raise ValueError('Driver has reached 70-hour/8-day cycle.')
 
         # Get routes for both legs
-        leg1_route = self.get_ors_route(current_coords, pickup_coords)
-        leg2_route = self.get_ors_route(pickup_coords, dropoff_coords)
+        leg1_route, leg2_route = self._fetch_routes(
+            [(current_coords, pickup_coords), (pickup_coords, dropoff_coords)]
+        )
 
         total_distance = leg1_route['distance_miles'] + leg2_route['distance_miles']
 
+        # Decode both route geometries once, used to place the stops and for
+        # the simplified levels
+        leg1_geometry = decode_polyline(leg1_route['geometry'])
+        leg2_geometry = decode_polyline(leg2_route['geometry'])
+
         # Generate stop sequence
         start_time = self._get_next_start_time()
         stops = self._generate_stops(
@@ -80,31 +129,24 @@ class ELDTripPlanner:
             dropoff_location=dropoff_location,
             leg1_route=leg1_route,
             leg2_route=leg2_route,
+            leg1_geometry=leg1_geometry,
+            leg2_geometry=leg2_geometry,
             start_time=start_time,
-            current_cycle_used=current_cycle_used,
+            current_cycle_used=cycle_used,
         )
 
         # Generate daily logs from stops
         daily_logs = self._generate_daily_logs(stops, start_time)
 
         # Calculate totals
-        total_driving_hrs = sum(
-            s['duration_hours'] for s in stops if s['stop_type'] == 'DRIVING'
+        total_driving_hrs = self.rules.ticks_to_hours(
+            sum(s['duration_ticks'] for s in stops if s['stop_type'] == 'DRIVING'),
+            quantize=True,
         )
 
-        # Create GeoJSON LineString from both route geometries
-        from openrouteservice import convert
-
-        decoded_geometry1 = convert.decode_polyline(leg1_route['geometry'])[
-            'coordinates'
-        ]
-        decoded_geometry2 = convert.decode_polyline(leg2_route['geometry'])[
-            'coordinates'
-        ]
-        full_geometry = decoded_geometry1 + decoded_geometry2
-        geojson_linestring = json.dumps(
-            {'type': 'LineString', 'coordinates': full_geometry}
-        )
+        # Full route as a single encoded polyline, decoded again only when a
+        # client asks for GeoJSON
+        full_geometry = leg1_geometry + leg2_geometry
 
         return {
             'trip_data': {
@@ -115,9 +157,14 @@ class ELDTripPlanner:
                 'dropoff_location': dropoff_location,
                 'dropoff_coordinates': f'{dropoff_coords[0]},{dropoff_coords[1]}',
                 'current_cycle_used': current_cycle_used,
-                'route_data': geojson_linestring,
+                'route_geometry': encode_polyline(full_geometry),
+                'route_levels': simplify_route(
+                    full_geometry, settings.ROUTE_SIMPLIFY_TOLERANCES
+                ),
                 'total_trip_miles': total_distance,
                 'total_driving_hrs': total_driving_hrs,
+                'stale_route': leg1_route.get('stale', False)
+                or leg2_route.get('stale', False),
             },
             'trip_routes': stops,
             'daily_logs': daily_logs,
@@ -127,13 +174,25 @@ class ELDTripPlanner:
             },
         }
 
+    def _fetch_routes(self, legs: list[tuple]) -> list[dict]:
+        """
+        Fetch the route of every leg, in a single multi-waypoint call when
+        available, otherwise one leg after the other. Results keep the order
+        of `legs`.
+        """
+        if self.get_ors_routes is not None:
+            waypoints = [legs[0][0]] + [end for _, end in legs]
+            return self.get_ors_routes(waypoints)
+
+        return [self.get_ors_route(start, end) for start, end in legs]
+
     def _get_next_start_time(self) -> datetime:
         """Get next 7:00 AM start time."""
         now = timezone.now()
         start = now.replace(
-            hour=settings.START_TIME_HOUR, minute=0, second=0, microsecond=0
+            hour=self.rules.start_hour, minute=0, second=0, microsecond=0
         )
-        if now.hour >= settings.START_TIME_HOUR:
+        if now.hour >= self.rules.start_hour:
             start += timedelta(days=1)
         return start
 
@@ -147,6 +206,8 @@ class ELDTripPlanner:
         dropoff_location,
         leg1_route,
         leg2_route,
+        leg1_geometry,
+        leg2_geometry,
         start_time,
         current_cycle_used,
     ) -> list[dict]:
@@ -155,271 +216,258 @@ class ELDTripPlanner:
         """
 
         stops = []
-        order = 0
-        current_time = start_time
-        daily_driving = Decimal('0.0')
-        daily_on_duty = Decimal('0.0')
-        consecutive_driving = Decimal('0.0')
-        cycle_used = current_cycle_used
-        miles_since_fuel = Decimal('0.0')
+        clock = DutyClock(start_time=start_time, cycle_used=current_cycle_used)
 
         # Process Leg 1: Current to Pickup
-        (
-            current_time,
-            order,
-            daily_driving,
-            daily_on_duty,
-            consecutive_driving,
-            cycle_used,
-            miles_since_fuel,
-        ) = self._process_leg(
+        self._process_leg(
             stops,
-            order,
-            current_time,
+            clock,
             current_coords,
-            current_location,
             pickup_coords,
             pickup_location,
             leg1_route,
-            daily_driving,
-            daily_on_duty,
-            consecutive_driving,
-            cycle_used,
-            miles_since_fuel,
+            leg1_geometry,
             is_pickup=True,
         )
 
         # Process Leg 2: Pickup to Dropoff
-        (
-            current_time,
-            order,
-            daily_driving,
-            daily_on_duty,
-            consecutive_driving,
-            cycle_used,
-            miles_since_fuel,
-        ) = self._process_leg(
+        self._process_leg(
             stops,
-            order,
-            current_time,
+            clock,
             pickup_coords,
-            pickup_location,
             dropoff_coords,
             dropoff_location,
             leg2_route,
-            daily_driving,
-            daily_on_duty,
-            consecutive_driving,
-            cycle_used,
-            miles_since_fuel,
+            leg2_geometry,
             is_pickup=False,
         )
 
         return stops
 
+    def _add_stop(self, stops, clock, stop_type, location_name, coords, ticks, notes):
+        """Append a stop at the clock's current time and advance the clock."""
+        arrival = clock.start_time + self.rules.ticks_to_timedelta(clock.elapsed)
+        clock.elapsed += ticks
+        departure = clock.start_time + self.rules.ticks_to_timedelta(clock.elapsed)
+        stops.append(
+            {
+                'stop_order': clock.order,
+                'stop_type': stop_type,
+                'location_name': location_name,
+                'latitude': coords[1],
+                'longitude': coords[0],
+                'estimated_arrival': arrival,
+                'estimated_departure': departure,
+                'duration_ticks': ticks,
+                'duration_hours': self.rules.ticks_to_hours(ticks),
+                'notes': notes,
+            }
+        )
+        clock.order += 1
+
     def _process_leg(
         self,
         stops,
-        order,
-        current_time,
+        clock,
         start_coords,
-        start_location,
         end_coords,
         end_location,
         route_data,
-        daily_driving,
-        daily_on_duty,
-        consecutive_driving,
-        cycle_used,
-        miles_since_fuel,
+        geometry,
         is_pickup,
     ):
         """Process a single leg of the journey with HOS compliance."""
-        remaining_distance = route_data['distance_miles']
-        current_coords = start_coords
+        rules = self.rules
+        remaining_distance = rules.miles_to_ticks(route_data['distance_miles'])
+        locate = self._get_locator(start_coords, geometry, remaining_distance)
 
         while remaining_distance > 0:
+            current_coords = locate(remaining_distance)
+
             # Check mandatory rest break
             # 30 min after 8 hrs
-            if consecutive_driving >= settings.REQUIRED_BREAK_AFTER_HOURS:
-                stops.append(
-                    {
-                        'stop_order': order,
-                        'stop_type': 'REST',
-                        'location_name': 'Rest Area (30-min break)',
-                        'latitude': current_coords[1],
-                        'longitude': current_coords[0],
-                        'estimated_arrival': current_time,
-                        'estimated_departure': current_time
-                        + timedelta(hours=float(settings.REQUIRED_BREAK_DURATION)),
-                        'duration_hours': settings.REQUIRED_BREAK_DURATION,
-                        'notes': 'Mandatory 30-minute break after 8 hours driving',
-                    }
-                )
-                order += 1
-                current_time += timedelta(hours=float(settings.REQUIRED_BREAK_DURATION))
-                daily_on_duty += settings.REQUIRED_BREAK_DURATION
-                consecutive_driving = Decimal('0.0')
+            if clock.consecutive_driving >= rules.break_after:
+                self._add_rest(stops, clock, current_coords)
 
             # Check sleeper berth
             # 10 hrs after 14 hrs on-duty or 11 hrs driving
             if (
-                daily_on_duty >= settings.MAX_ON_DUTY_HOURS_PER_DAY
-                or daily_driving >= settings.MAX_DRIVING_HOURS_PER_DAY
+                clock.daily_on_duty >= rules.max_on_duty
+                or clock.daily_driving >= rules.max_driving
             ):
-                stops.append(
-                    {
-                        'stop_order': order,
-                        'stop_type': 'SLEEPER',
-                        'location_name': 'Sleeper Berth/Rest Stop',
-                        'latitude': current_coords[1],
-                        'longitude': current_coords[0],
-                        'estimated_arrival': current_time,
-                        'estimated_departure': current_time
-                        + timedelta(hours=float(settings.REQUIRED_OFF_DUTY_HOURS)),
-                        'duration_hours': settings.REQUIRED_OFF_DUTY_HOURS,
-                        'notes': '10-hour off-duty rest period',
-                    }
-                )
-                order += 1
-                current_time += timedelta(hours=float(settings.REQUIRED_OFF_DUTY_HOURS))
-                daily_driving = Decimal('0.0')
-                daily_on_duty = Decimal('0.0')
-                consecutive_driving = Decimal('0.0')
+                self._add_sleeper(stops, clock, current_coords)
 
             # Check fuel stops after 1000 miles
-            if miles_since_fuel >= settings.FUELING_INTERVAL_MILES:
-                stops.append(
-                    {
-                        'stop_order': order,
-                        'stop_type': 'FUEL',
-                        'location_name': 'Fuel Stop',
-                        'latitude': current_coords[1],
-                        'longitude': current_coords[0],
-                        'estimated_arrival': current_time,
-                        'estimated_departure': current_time
-                        + timedelta(hours=float(settings.FUELING_DURATION_HOURS)),
-                        'duration_hours': settings.FUELING_DURATION_HOURS,
-                        'notes': 'Fueling stop',
-                    }
-                )
-                order += 1
-                current_time += timedelta(hours=float(settings.FUELING_DURATION_HOURS))
-                daily_on_duty += settings.FUELING_DURATION_HOURS
-                miles_since_fuel = Decimal('0.0')
+            if clock.miles_since_fuel >= rules.fueling_interval:
+                self._add_fuel(stops, clock, current_coords)
 
             # Check cycle limit
-            if cycle_used >= settings.MAX_CYCLE_HOURS:
+            if clock.cycle_used >= rules.max_cycle:
                 raise ValueError('70-hour/8-day cycle limit reached. Cannot continue.')
 
             # Calculate driving time available in this segment
             available_driving = min(
-                settings.MAX_DRIVING_HOURS_PER_DAY - daily_driving,
-                settings.MAX_ON_DUTY_HOURS_PER_DAY - daily_on_duty,
-                settings.REQUIRED_BREAK_AFTER_HOURS - consecutive_driving,
-                settings.MAX_CYCLE_HOURS - cycle_used,
+                rules.max_driving - clock.daily_driving,
+                rules.max_on_duty - clock.daily_on_duty,
+                rules.break_after - clock.consecutive_driving,
+                rules.max_cycle - clock.cycle_used,
             )
 
+            # A fuel stop can use up the last on-duty time of the day, the
+            # checks above then schedule the sleeper on the next pass
+            if available_driving <= 0:
+                continue
+
+            # A tick of driving covers a tick of distance
             drive_distance = min(
                 remaining_distance,
-                available_driving * settings.AVERAGE_SPEED_MPH,
-                settings.FUELING_INTERVAL_MILES - miles_since_fuel,
+                available_driving,
+                rules.fueling_interval - clock.miles_since_fuel,
             )
-
-            drive_time = drive_distance / settings.AVERAGE_SPEED_MPH
-            mile_segment = round(float(drive_distance), 1)
-
-            # Add driving segment
-            stops.append(
-                {
-                    'stop_order': order,
-                    'stop_type': 'DRIVING',
-                    'location_name': f'Driving segment ({mile_segment} miles)',
-                    'latitude': current_coords[1],
-                    'longitude': current_coords[0],
-                    'estimated_arrival': current_time,
-                    'estimated_departure': current_time
-                    + timedelta(hours=float(drive_time)),
-                    'duration_hours': drive_time,
-                    'notes': f'Driving {float(drive_distance):.1f} miles',
-                }
-            )
-
-            order += 1
-            current_time += timedelta(hours=float(drive_time))
-            daily_driving += drive_time
-            daily_on_duty += drive_time
-            consecutive_driving += drive_time
-            cycle_used += drive_time
+            self._add_driving(stops, clock, current_coords, drive_distance)
             remaining_distance -= drive_distance
-            miles_since_fuel += drive_distance
 
         # Add pickup or dropoff stop
         stop_type = 'PICKUP' if is_pickup else 'DROPOFF'
-        stops.append(
-            {
-                'stop_order': order,
-                'stop_type': stop_type,
-                'location_name': end_location,
-                'latitude': end_coords[1],
-                'longitude': end_coords[0],
-                'estimated_arrival': current_time,
-                'estimated_departure': current_time
-                + timedelta(hours=float(settings.PICKUP_DROPOFF_DURATION)),
-                'duration_hours': settings.PICKUP_DROPOFF_DURATION,
-                'notes': f'{stop_type.title()} location - 1 hour',
-            }
+        self._add_stop(
+            stops,
+            clock,
+            stop_type,
+            end_location,
+            end_coords,
+            rules.pickup_dropoff_duration,
+            f'{stop_type.title()} location - 1 hour',
         )
-        order += 1
-        current_time += timedelta(hours=float(settings.PICKUP_DROPOFF_DURATION))
-        daily_on_duty += settings.PICKUP_DROPOFF_DURATION
-
-        return (
-            current_time,
-            order,
-            daily_driving,
-            daily_on_duty,
-            consecutive_driving,
-            cycle_used,
-            miles_since_fuel,
+        clock.daily_on_duty += rules.pickup_dropoff_duration
+
+    def _add_sleeper(self, stops, clock, coords):
+        self._add_stop(
+            stops,
+            clock,
+            'SLEEPER',
+            'Sleeper Berth/Rest Stop',
+            coords,
+            self.rules.off_duty,
+            '10-hour off-duty rest period',
         )
+        clock.daily_driving = 0
+        clock.daily_on_duty = 0
+        clock.consecutive_driving = 0
+
+    def _add_rest(self, stops, clock, coords):
+        self._add_stop(
+            stops,
+            clock,
+            'REST',
+            'Rest Area (30-min break)',
+            coords,
+            self.rules.break_duration,
+            'Mandatory 30-minute break after 8 hours driving',
+        )
+        clock.daily_on_duty += self.rules.break_duration
+        clock.consecutive_driving = 0
+
+    def _add_fuel(self, stops, clock, coords):
+        self._add_stop(
+            stops,
+            clock,
+            'FUEL',
+            'Fuel Stop',
+            coords,
+            self.rules.fueling_duration,
+            'Fueling stop',
+        )
+        clock.daily_on_duty += self.rules.fueling_duration
+        clock.miles_since_fuel = 0
+
+    def _add_driving(self, stops, clock, coords, distance):
+        mile_segment = round(self.rules.ticks_to_miles(distance), 1)
+        self._add_stop(
+            stops,
+            clock,
+            'DRIVING',
+            f'Driving segment ({mile_segment} miles)',
+            coords,
+            distance,
+            f'Driving {mile_segment:.1f} miles',
+        )
+        clock.daily_driving += distance
+        clock.daily_on_duty += distance
+        clock.consecutive_driving += distance
+        clock.cycle_used += distance
+        clock.miles_since_fuel += distance
+
+    def _get_locator(self, start_coords, geometry, leg_distance):
+        """
+        Return a function giving the coordinates of the truck when
+        `remaining` ticks of the leg are left.
+
+        The leg geometry is indexed by cumulative mileage once, the progress
+        along the leg is then mapped onto it as a fraction of the distance
+        reported by ORS, since the road distance and the polyline length do
+        not match exactly.
+        """
+        if len(geometry) < 2:
+            return lambda remaining: start_coords
+
+        route_index = RouteIndex(geometry)
+
+        def locate(remaining):
+            if remaining >= leg_distance:
+                return start_coords
+
+            lon, lat = route_index.locate_fraction(1 - remaining / leg_distance)
+
+            return Decimal(f'{lon:.6f}'), Decimal(f'{lat:.6f}')
+
+        return locate
 
     def _generate_daily_logs(
         self, stops: list[dict], start_time: datetime
     ) -> list[dict]:
         """Generate daily logs from stop data."""
         daily_logs = {}
+        duty_fields = {
+            'DRIVING': ('driving_hrs',),
+            'SLEEPER': ('sleeper_berth_hrs', 'off_duty_hrs'),
+            'PICKUP': ('on_duty_not_driving_hrs',),
+            'DROPOFF': ('on_duty_not_driving_hrs',),
+            'FUEL': ('on_duty_not_driving_hrs',),
+            'REST': ('on_duty_not_driving_hrs',),
+        }
 
         for stop in stops:
-            arrival = stop['estimated_arrival']
-            duration = stop['duration_hours']
-            log_date = arrival.date()
+            log_date = stop['estimated_arrival'].date()
 
             if log_date not in daily_logs:
                 daily_logs[log_date] = {
                     'log_date': log_date,
-                    'driving_hrs': Decimal('0.0'),
-                    'on_duty_not_driving_hrs': Decimal('0.0'),
-                    'sleeper_berth_hrs': Decimal('0.0'),
-                    'off_duty_hrs': Decimal('0.0'),
+                    'driving_hrs': 0,
+                    'on_duty_not_driving_hrs': 0,
+                    'sleeper_berth_hrs': 0,
+                    'off_duty_hrs': 0,
                     'notes': [],
                 }
 
             log = daily_logs[log_date]
 
-            if stop['stop_type'] == 'DRIVING':
-                log['driving_hrs'] += duration
-            elif stop['stop_type'] == 'SLEEPER':
-                log['sleeper_berth_hrs'] += duration
-                log['off_duty_hrs'] += duration
-            elif stop['stop_type'] in ['PICKUP', 'DROPOFF', 'FUEL', 'REST']:
-                log['on_duty_not_driving_hrs'] += duration
+            # Accumulate ticks, converted to hours below
+            for field in duty_fields.get(stop['stop_type'], ()):
+                log[field] += stop['duration_ticks']
 
             if stop.get('notes'):
                 log['notes'].append(stop['notes'])
 
-        # Convert notes list to string
         for log in daily_logs.values():
+            for field in (
+                'driving_hrs',
+                'on_duty_not_driving_hrs',
+                'sleeper_berth_hrs',
+                'off_duty_hrs',
+            ):
+                log[field] = self.rules.ticks_to_hours(log[field], quantize=True)
+
+            # Convert notes list to string
             log['notes'] = '; '.join(log['notes']) if log['notes'] else ''
 
         return list(daily_logs.values())
@@ -440,8 +488,7 @@ def prepare_trip_route_data(route_data):
     return {k: v for k, v in route_data.items() if k in trip_route_fields}
 
 
-@transaction.atomic
-def run_trip_calculation(
+def plan_trip(
     current_location,
     current_coordinates,
     pickup_location,
@@ -449,8 +496,15 @@ def run_trip_calculation(
     dropoff_location,
     dropoff_coordinates,
     current_cycle_used_hrs,
+    planner=None,
 ):
-    planner = ELDTripPlanner(get_ors_route)
+    """
+    Network and compute phase of a trip calculation: fetch the routes and run
+    the HOS planner. Runs outside any database transaction so no connection
+    is held open while waiting on ORS.
+    """
+    if planner is None:
+        planner = ELDTripPlanner(get_ors_route, get_ors_routes)
 
     current_lat, current_lon = parse_coordinates(current_coordinates)
     pickup_lat, pickup_lon = parse_coordinates(pickup_coordinates)
@@ -466,27 +520,261 @@ def run_trip_calculation(
         dropoff_location=dropoff_location,
     )
 
-    # Create Trip instance
-    trip_instance = Trip.objects.create(
-        current_location=current_location,
-        current_coordinates=current_coordinates,
-        pickup_location=pickup_location,
-        pickup_coordinates=pickup_coordinates,
-        dropoff_location=dropoff_location,
-        dropoff_coordinates=dropoff_coordinates,
-        current_cycle_used=current_cycle_used_hrs,
-        route_data=plan['trip_data']['route_data'],
-        total_trip_miles=plan['trip_data']['total_trip_miles'],
-        total_driving_hrs=plan['trip_data']['total_driving_hrs'],
-    )
+    # Trip fields as they are stored, coordinates kept in their input format
+    plan['trip'] = {
+        'current_location': current_location,
+        'current_coordinates': current_coordinates,
+        'pickup_location': pickup_location,
+        'pickup_coordinates': pickup_coordinates,
+        'dropoff_location': dropoff_location,
+        'dropoff_coordinates': dropoff_coordinates,
+        'current_cycle_used': current_cycle_used_hrs,
+        'route_geometry': plan['trip_data']['route_geometry'],
+        'route_levels': plan['trip_data']['route_levels'],
+        'total_trip_miles': plan['trip_data']['total_trip_miles'],
+        'total_driving_hrs': plan['trip_data']['total_driving_hrs'],
+        'timeline': timeline_from_stops(plan['trip_routes'], planner.rules),
+        'stale_route': plan['trip_data']['stale_route'],
+    }
+
+    return plan
+
+
+@transaction.atomic
+def persist_trip_plans(plans):
+    """
+    Persistence phase of trip calculations, a short atomic write. Trips,
+    stops and daily logs are each inserted in bulk, so the number of
+    statements grows neither with the length nor with the number of trips.
+    """
+    # Create Trip instances
+    trip_instances = Trip.objects.bulk_create(Trip(**plan['trip']) for plan in plans)
 
     # Create TripRoute instances
-    for route_data in plan['trip_routes']:
-        clean_route_data = prepare_trip_route_data(route_data)
-        TripRoute.objects.create(trip=trip_instance, **clean_route_data)
+    TripRoute.objects.bulk_create(
+        TripRoute(trip=trip_instance, **prepare_trip_route_data(route_data))
+        for trip_instance, plan in zip(trip_instances, plans)
+        for route_data in plan['trip_routes']
+    )
 
     # Create TripLog instances
-    for log_data in plan['daily_logs']:
-        TripLog.objects.create(trip=trip_instance, **log_data)
+    TripLog.objects.bulk_create(
+        TripLog(trip=trip_instance, **log_data)
+        for trip_instance, plan in zip(trip_instances, plans)
+        for log_data in plan['daily_logs']
+    )
+
+    # bulk_create sends no post_save, so the cached responses are dropped here
+    transaction.on_commit(bump_trips_version)
+
+    return trip_instances
+
+
+def persist_trip_plan(plan):
+    return persist_trip_plans([plan])[0]
+
+
+def get_trip_flight_key(trip_data):
+    """
+    Single-flight key of a calculation, equal for inputs planning the same
+    trip: coordinates to 6 decimals, location names without case or padding
+    and the cycle hours as they are stored.
+    """
+    parts = [
+        str(Decimal(trip_data['current_cycle_used_hrs']).quantize(Decimal('0.01')))
+    ]
+
+    for name in ('current', 'pickup', 'dropoff'):
+        lat, lon = parse_coordinates(trip_data[f'{name}_coordinates'])
+        parts += [
+            trip_data[f'{name}_location'].strip().casefold(),
+            f'{lat:.6f}',
+            f'{lon:.6f}',
+        ]
+
+    return 'trip:' + hashlib.sha1('|'.join(parts).encode()).hexdigest()
+
+
+def run_trip_calculation(
+    current_location,
+    current_coordinates,
+    pickup_location,
+    pickup_coordinates,
+    dropoff_location,
+    dropoff_coordinates,
+    current_cycle_used_hrs,
+):
+    """
+    Calculate and store a trip. Identical calculations running at the same
+    time, in any thread or worker, are coalesced into one.
+    """
+    trip_data = {
+        'current_location': current_location,
+        'current_coordinates': current_coordinates,
+        'pickup_location': pickup_location,
+        'pickup_coordinates': pickup_coordinates,
+        'dropoff_location': dropoff_location,
+        'dropoff_coordinates': dropoff_coordinates,
+        'current_cycle_used_hrs': current_cycle_used_hrs,
+    }
+
+    return single_flight(
+        get_trip_flight_key(trip_data),
+        lambda: persist_trip_plan(plan_trip(**trip_data)),
+        dump=lambda trip: trip.pk,
+        load=lambda pk: Trip.objects.filter(pk=pk).first(),
+    )
+
+
+async def arun_trip_calculation(**trip_data):
+    """
+    Async counterpart of `run_trip_calculation`, for the ASGI entry point.
+
+    The routes are awaited on the event loop, the planner runs in a worker
+    thread and the plan is persisted through a thread-sensitive call, so no
+    thread is held while ORS answers.
+    """
+    current, pickup, dropoff = (
+        parse_coordinates(trip_data[name])[::-1]
+        for name in ('current_coordinates', 'pickup_coordinates', 'dropoff_coordinates')
+    )
+
+    async def compute():
+        routes = await aget_ors_routes([current, pickup, dropoff])
+
+        plan = await sync_to_async(plan_trip_with_routes, thread_sensitive=False)(
+            trip_data, routes
+        )
+
+        return await sync_to_async(persist_trip_plan)(plan)
+
+    async def load(pk):
+        return await Trip.objects.filter(pk=pk).afirst()
+
+    return await asingle_flight(
+        get_trip_flight_key(trip_data),
+        compute,
+        dump=lambda trip: trip.pk,
+        load=load,
+    )
+
+
+def get_planner_pool():
+    """Process pool for batch planning, None when it is disabled."""
+    global _planner_pool
+
+    if settings.TRIP_BATCH_WORKERS < 2:
+        return None
+
+    with _planner_pool_lock:
+        if _planner_pool is None:
+            _planner_pool = ProcessPoolExecutor(
+                max_workers=settings.TRIP_BATCH_WORKERS,
+                initializer=django.setup,
+            )
+
+    return _planner_pool
+
+
+def _fetch_all(fetch, legs):
+    """`fetch(leg)` of every leg on the route pool, or the exception it raised."""
+    futures = [ROUTE_EXECUTOR.submit(fetch, leg) for leg in legs]
+
+    results = []
+    for future in futures:
+        try:
+            results.append(future.result())
+        except Exception as e:
+            results.append(e)
+
+    return results
+
+
+def fetch_batch_routes(legs):
+    """
+    Fetch the route of every distinct leg once.
+
+    Returns a dict keyed on the route cache key of each leg, holding either
+    the route or the exception raised while fetching it. Only ORS is called
+    from the pool threads, the route cache is written by this thread.
+    """
+    distinct_legs = {}
+    for start, end in legs:
+        distinct_legs.setdefault(make_cache_key(start, end, ORS_PROFILE), (start, end))
+
+    routes = get_ors_leg_routes(list(distinct_legs.values()), _fetch_all)
+
+    return dict(zip(distinct_legs, routes))
+
+
+def plan_trip_with_routes(trip_data, routes):
+    """Plan a trip from already fetched routes, run in the planner pool."""
+    planner = ELDTripPlanner(None, lambda coordinates: routes)
+
+    return plan_trip(**trip_data, planner=planner)
+
+
+def run_trip_calculations(trips):
+    """
+    Calculate a batch of trips.
+
+    Distinct legs are fetched once for the whole batch, the planner runs in
+    the process pool and every successful plan is persisted in one bulk
+    write. Returns one entry per trip, either the created Trip or the
+    exception raised while calculating it.
+    """
+    results = [None] * len(trips)
+    trip_legs = {}
+
+    for index, trip_data in enumerate(trips):
+        try:
+            current, pickup, dropoff = (
+                parse_coordinates(trip_data[name])[::-1]
+                for name in (
+                    'current_coordinates',
+                    'pickup_coordinates',
+                    'dropoff_coordinates',
+                )
+            )
+        except ValueError as e:
+            results[index] = e
+            continue
+
+        trip_legs[index] = [(current, pickup), (pickup, dropoff)]
+
+    routes = fetch_batch_routes(leg for legs in trip_legs.values() for leg in legs)
+
+    pool = get_planner_pool()
+    pending = {}
+
+    for index, legs in trip_legs.items():
+        leg_routes = [
+            routes[make_cache_key(start, end, ORS_PROFILE)] for start, end in legs
+        ]
+        error = next((r for r in leg_routes if isinstance(r, Exception)), None)
+
+        if error is not None:
+            results[index] = error
+        elif pool is None or len(trip_legs) < 2:
+            try:
+                results[index] = plan_trip_with_routes(trips[index], leg_routes)
+            except Exception as e:
+                results[index] = e
+        else:
+            pending[index] = pool.submit(
+                plan_trip_with_routes, trips[index], leg_routes
+            )
+
+    for index, future in pending.items():
+        try:
+            results[index] = future.result()
+        except Exception as e:
+            results[index] = e
+
+    planned = [i for i, result in enumerate(results) if isinstance(result, dict)]
+    trip_instances = persist_trip_plans([results[i] for i in planned])
+
+    for index, trip_instance in zip(planned, trip_instances):
+        results[index] = trip_instance
 
-    return trip_instance
+    return results
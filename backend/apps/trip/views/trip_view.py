@@ -1,58 +1,211 @@
-from decimal import Decimal
+import math
+import logging
 
-from django.http import Http404, JsonResponse
+from django.conf import settings
+from django.http import JsonResponse
+from django.urls import reverse
+from asgiref.sync import sync_to_async
+from django.views import View
 from rest_framework import status, viewsets
 from django.shortcuts import get_object_or_404
 from rest_framework.views import APIView
+from django.utils.decorators import method_decorator
 from rest_framework.response import Response
 from rest_framework.decorators import action
+from rest_framework.exceptions import APIException
+from rest_framework.permissions import IsAdminUser
+from django.views.decorators.csrf import csrf_exempt
 
-from apps.trip.utils.trip_utils import run_trip_calculation
+from api.utils.etag import make_etag, etag_matches, not_modified, set_cache_headers
+from api.utils.pagination import KeysetPagination
+from api.utils.idempotency import idempotent
+
+from apps.trip.utils.geo_utils import (
+    pick_route_level,
+    zoom_to_tolerance,
+    polyline_to_geojson,
+)
+from apps.trip.utils.job_utils import enqueue_trip_job, get_error_result
+from apps.trip.utils.ors_utils import ORS_BREAKER, RoutingFailed, ors_http_stats
+from apps.trip.utils.trip_utils import (
+    run_trip_calculation,
+    arun_trip_calculation,
+    run_trip_calculations,
+)
 from apps.trip.models.trip_models import Trip
-from apps.trip.serializers.trip_serializer import TripSerializer
+from apps.trip.utils.timeline_utils import expand_timeline, timeline_from_routes
+from apps.trip.models.trip_job_models import TripJob
+from apps.trip.utils.route_cache_utils import route_cache
+from apps.trip.utils.response_cache_utils import (
+    cache_response,
+    make_response_key,
+    get_cached_response,
+)
+from apps.trip.serializers.trip_serializer import TripSerializer, TripListSerializer
+from apps.trip.utils.circuit_breaker_utils import RoutingUnavailable
+from apps.trip.serializers.trip_job_serializer import TripJobSerializer
+
+
+logger = logging.getLogger(__name__)
+
+
+def get_retry_headers():
+    """`Retry-After` of a calculation refused while routing is unavailable."""
+    return {'Retry-After': str(math.ceil(ORS_BREAKER.retry_after()) or 1)}
+
+
+def get_error_status(error):
+    """
+    Status of an unexpected calculation error: 400 when ORS rejected the
+    request, 500 otherwise, so that idempotency keys do not keep it.
+    """
+    if isinstance(error, APIException):
+        return status.HTTP_400_BAD_REQUEST
+
+    return status.HTTP_500_INTERNAL_SERVER_ERROR
+
+
+def is_nested(request):
+    """Include the stops and daily logs of trips with `?nested=true`."""
+    nested = request.query_params.get('nested', '')
+
+    return nested.lower() in ('1', 'true', 'yes')
+
+
+def is_lean(request):
+    """Leave the stops and daily logs out of a trip summary with `?lean=true`."""
+    lean = request.query_params.get('lean', '')
+
+    return lean.lower() in ('1', 'true', 'yes')
+
+
+def is_async(request):
+    """Queue the calculation instead of running it with `?async=true`."""
+    value = request.query_params.get('async', '')
+
+    return value.lower() in ('1', 'true', 'yes')
+
+
+def get_trip_etag(uid, *variant):
+    """
+    Strong ETag of a trip representation, from its id and `updated_at`, or
+    None when the trip does not exist. Only `updated_at` is read, so a
+    matching `If-None-Match` is answered before the trip is loaded.
+    """
+    updated_at = (
+        Trip.objects.filter(id=uid).values_list('updated_at', flat=True).first()
+    )
+    if updated_at is None:
+        return None
+
+    return make_etag(uid, updated_at.isoformat(), *variant)
 
 
 class TripView(viewsets.ModelViewSet):
     model = Trip
     serializer_class = TripSerializer
+    pagination_class = KeysetPagination
+
+    def get_serializer_class(self):
+        if self.action == 'list' and not is_nested(self.request):
+            return TripListSerializer
+
+        return self.serializer_class
 
     def get_queryset(self):
-        return self.model.objects.all().order_by('-created_at')
+        queryset = self.model.objects.all().order_by('-created_at')
+
+        if self.action == 'list':
+            # The route geometry is only served by the summary endpoint
+            queryset = queryset.defer('route_data', 'route_geometry', 'route_levels')
+
+            if is_nested(self.request):
+                queryset = queryset.prefetch_related('daily_logs', 'trip_routes')
+
+        elif self.action == 'retrieve':
+            queryset = queryset.prefetch_related('daily_logs', 'trip_routes')
+
+        return queryset
 
     def get_object(self):
-        return get_object_or_404(self.model, id=self.kwargs['uid'])
+        return get_object_or_404(self.get_queryset(), id=self.kwargs['uid'])
+
+    def list(self, request, *args, **kwargs):
+        key = make_response_key('list', request)
+
+        data = get_cached_response(key)
+        if data is None:
+            data = super().list(request, *args, **kwargs).data
+            cache_response(key, data)
+
+        return Response(data)
+
+    def retrieve(self, request, *args, **kwargs):
+        etag = get_trip_etag(self.kwargs['uid'], 'detail')
+
+        if etag is not None and etag_matches(request, etag):
+            return not_modified(etag)
+
+        response = super().retrieve(request, *args, **kwargs)
+
+        return set_cache_headers(response, etag) if etag else response
 
     # Custom action to trigger the complex calculation logic
     @action(detail=False, methods=['post'], url_path='calculate')
+    @idempotent('calculate')
     def calculate_trip(self, request):
         """
         Custom endpoint to trigger the full trip calculation.
         Inputs: current_location, pickup_location, dropoff_location,
         current_cycle_used_hrs.
-        Outputs: A full Trip object with nested RouteStops and DailyLogs.
+        Outputs: A full Trip object with nested RouteStops and DailyLogs, or
+        with `?async=true` the queued job, to poll at `jobs/<id>/`.
+        A retry with the same `Idempotency-Key` header gets the first
+        response back, without calculating or saving the trip again.
         """
 
         serializer = self.get_serializer(data=request.data)
         serializer.is_valid(raise_exception=True)
 
         data = serializer.validated_data
+        trip_data = {
+            'current_location': data.get('current_location'),
+            'current_coordinates': data.get('current_coordinates'),
+            'pickup_location': data.get('pickup_location'),
+            'pickup_coordinates': data.get('pickup_coordinates'),
+            'dropoff_location': data.get('dropoff_location'),
+            'dropoff_coordinates': data.get('dropoff_coordinates'),
+            'current_cycle_used_hrs': data.get('current_cycle_used'),
+        }
+
+        if is_async(request):
+            job = enqueue_trip_job(trip_data, user=request.user)
+
+            return Response(
+                TripJobSerializer(job).data,
+                status=status.HTTP_202_ACCEPTED,
+                headers={'Location': reverse('trip_job', kwargs={'uid': job.id})},
+            )
 
         try:
             # Perform HOS and routing logic
-            trip_instance = run_trip_calculation(
-                current_location=data.get('current_location'),
-                current_coordinates=data.get('current_coordinates'),
-                pickup_location=data.get('pickup_location'),
-                pickup_coordinates=data.get('pickup_coordinates'),
-                dropoff_location=data.get('dropoff_location'),
-                dropoff_coordinates=data.get('dropoff_coordinates'),
-                current_cycle_used_hrs=data.get('current_cycle_used'),
-            )
+            trip_instance = run_trip_calculation(**trip_data)
 
             data_serializer = TripSerializer(trip_instance)
 
             return Response(data_serializer.data, status=status.HTTP_201_CREATED)
 
+        except RoutingUnavailable as e:
+            return Response(
+                get_error_result(e),
+                status=e.status_code,
+                headers=get_retry_headers(),
+            )
+
+        except RoutingFailed as e:
+            # Upstream failure, a 5xx so the response is not kept for replay
+            return Response(get_error_result(e), status=status.HTTP_502_BAD_GATEWAY)
+
         except ValueError as ve:
             return Response(
                 {'error': 'Calculation error', 'detail': str(ve)},
@@ -61,90 +214,320 @@ class TripView(viewsets.ModelViewSet):
 
         except Exception as e:
             # Handle potential failures from the map API or calculation errors
-            print(f'Calculation service error: {e}')
+            logger.warning('Calculation service error: %s', e)
             return Response(
                 {'error': 'Trip calculation failed.', 'detail': str(e)},
+                status=get_error_status(e),
+            )
+
+    @action(detail=False, methods=['post'], url_path='calculate/batch')
+    def calculate_batch(self, request):
+        """
+        Calculate many trips in one request.
+        Inputs: `trips`, a list of `calculate` payloads.
+        Outputs: One result per trip, in the same order, holding either the
+        created Trip or the validation or calculation error.
+        """
+        trips = request.data.get('trips') if isinstance(request.data, dict) else None
+
+        if not isinstance(trips, list) or not trips:
+            return Response(
+                {'error': 'Invalid batch', 'detail': 'Expected a list of trips.'},
+                status=status.HTTP_400_BAD_REQUEST,
+            )
+
+        if len(trips) > settings.TRIP_BATCH_MAX_SIZE:
+            return Response(
+                {
+                    'error': 'Invalid batch',
+                    'detail': f'A batch holds at most {settings.TRIP_BATCH_MAX_SIZE} '
+                    'trips.',
+                },
                 status=status.HTTP_400_BAD_REQUEST,
             )
 
+        results = [None] * len(trips)
+        valid = []
+
+        for index, item in enumerate(trips):
+            serializer = self.get_serializer(data=item)
+
+            if not serializer.is_valid():
+                results[index] = {
+                    'status': 'error',
+                    'error': 'Validation error',
+                    'detail': serializer.errors,
+                }
+                continue
+
+            data = serializer.validated_data
+            valid.append(index)
+            results[index] = {
+                'current_location': data.get('current_location'),
+                'current_coordinates': data.get('current_coordinates'),
+                'pickup_location': data.get('pickup_location'),
+                'pickup_coordinates': data.get('pickup_coordinates'),
+                'dropoff_location': data.get('dropoff_location'),
+                'dropoff_coordinates': data.get('dropoff_coordinates'),
+                'current_cycle_used_hrs': data.get('current_cycle_used'),
+            }
+
+        calculated = run_trip_calculations([results[index] for index in valid])
+
+        trip_ids = [trip.id for trip in calculated if isinstance(trip, Trip)]
+        trips_by_id = self.model.objects.prefetch_related(
+            'daily_logs', 'trip_routes'
+        ).in_bulk(trip_ids)
+
+        for index, trip in zip(valid, calculated):
+            if isinstance(trip, Trip):
+                results[index] = {
+                    'status': 'success',
+                    'data': TripSerializer(trips_by_id[trip.id]).data,
+                }
+            else:
+                results[index] = {'status': 'error', **get_error_result(trip)}
+
+        return Response({'results': results}, status=status.HTTP_200_OK)
+
+
+@method_decorator(csrf_exempt, name='dispatch')
+class TripCalculateAsyncView(View):
+    """
+    Native async `calculate` endpoint for the ASGI entry point, enabled with
+    `TRIP_ASYNC_CALCULATE`. Same input and output as `calculate_trip`, but
+    the worker awaits ORS on the event loop instead of blocking a thread.
+
+    DRF views are sync only, so the request is run through a `TripView` set
+    up for `calculate_trip`, with the same authentication, permissions and
+    throttles. CSRF is exempt as on every DRF view, the session and cookie
+    authenticators enforce it themselves.
+    """
+
+    def get_trip_view(self, request, *args, **kwargs):
+        """`TripView` of the request, as its `as_view` would set it up."""
+        view = TripView(action_map={'post': 'calculate_trip'}, detail=False)
+        view.args = args
+        view.kwargs = kwargs
+        view.request = view.initialize_request(request, *args, **kwargs)
+        view.headers = view.default_response_headers
+
+        return view
+
+    async def post(self, request, *args, **kwargs):
+        view = self.get_trip_view(request, *args, **kwargs)
+
+        try:
+            # Authentication and throttling may read the database
+            await sync_to_async(view.initial)(view.request, *args, **kwargs)
+
+            response = await self._calculate(view.request)
+
+        except Exception as exc:
+            response = view.handle_exception(exc)
+
+        response = view.finalize_response(view.request, response, *args, **kwargs)
+        await sync_to_async(response.render)()
+
+        return response
+
+    @idempotent('calculate')
+    async def _calculate(self, request):
+        serializer = TripSerializer(data=request.data)
+        await sync_to_async(serializer.is_valid)(raise_exception=True)
+
+        data = serializer.validated_data
+        trip_data = {
+            'current_location': data.get('current_location'),
+            'current_coordinates': data.get('current_coordinates'),
+            'pickup_location': data.get('pickup_location'),
+            'pickup_coordinates': data.get('pickup_coordinates'),
+            'dropoff_location': data.get('dropoff_location'),
+            'dropoff_coordinates': data.get('dropoff_coordinates'),
+            'current_cycle_used_hrs': data.get('current_cycle_used'),
+        }
+
+        if is_async(request):
+            job = await sync_to_async(enqueue_trip_job)(trip_data, user=request.user)
+
+            return Response(
+                TripJobSerializer(job).data,
+                status=status.HTTP_202_ACCEPTED,
+                headers={'Location': reverse('trip_job', kwargs={'uid': job.id})},
+            )
+
+        try:
+            trip_instance = await arun_trip_calculation(**trip_data)
+
+        except RoutingUnavailable as e:
+            return Response(
+                get_error_result(e),
+                status=e.status_code,
+                headers=get_retry_headers(),
+            )
+
+        except RoutingFailed as e:
+            return Response(get_error_result(e), status=status.HTTP_502_BAD_GATEWAY)
+
+        except ValueError as e:
+            return Response(get_error_result(e), status=status.HTTP_400_BAD_REQUEST)
+
+        except Exception as e:
+            logger.warning('Calculation service error: %s', e)
+
+            return Response(get_error_result(e), status=get_error_status(e))
+
+        trip = await Trip.objects.prefetch_related('daily_logs', 'trip_routes').aget(
+            id=trip_instance.id
+        )
+
+        return Response(TripSerializer(trip).data, status=status.HTTP_201_CREATED)
+
 
 class TripSummaryView(APIView):
-    def _get_status_type(self, stop_type):
+    def _get_tolerance(self, request):
         """
-        Convert stop type to ELD status.
+        Simplification tolerance in degrees from `?tolerance=` or `?zoom=`,
+        None for the full geometry.
         """
-        status_map = {
-            'DRIVING': 'DRIVING',
-            'PICKUP': 'ON_DUTY',
-            'DROPOFF': 'ON_DUTY',
-            'FUEL': 'ON_DUTY',
-            'REST': 'ON_DUTY',
-            'SLEEPER': 'SLEEPER_BERTH',
-        }
-        return status_map.get(stop_type, 'OFF_DUTY')
-
-    def _get_activity_description(self, route):
-        activity_map = {
-            'DRIVING': f'Driving - {route.location_name}',
-            'PICKUP': f'Pickup at {route.location_name}',
-            'DROPOFF': f'Dropoff at {route.location_name}',
-            'FUEL': f'Fueling at {route.location_name}',
-            'REST': f'Rest Break - {route.location_name}',
-            'SLEEPER': f'Sleeper Berth - {route.location_name}',
-        }
+        tolerance = request.query_params.get('tolerance')
+        zoom = request.query_params.get('zoom')
+
+        if tolerance is not None:
+            try:
+                tolerance = float(tolerance)
+            except ValueError:
+                tolerance = None
+
+            if tolerance is None or not 0 <= tolerance < float('inf'):
+                raise ValueError('tolerance must be a non-negative number.')
+
+            return tolerance
+
+        if zoom is not None:
+            if not zoom.isdigit() or int(zoom) > 30:
+                raise ValueError('zoom must be an integer between 0 and 30.')
+
+            return zoom_to_tolerance(int(zoom))
+
+        return None
+
+    def _get_geojson(self, trip, tolerance):
+        polyline = None
+        if tolerance is not None:
+            polyline = pick_route_level(trip.route_levels, tolerance)
+
+        if polyline is None:
+            polyline = trip.route_geometry
+
+        # Trips not yet compacted still hold the GeoJSON string
+        if not polyline:
+            return trip.route_data
 
-        return activity_map.get(route.stop_type, route.location_name)
+        return polyline_to_geojson(polyline)
 
     def get(self, request, uid):
         try:
-            trip = get_object_or_404(Trip, id=uid)
-        except Http404:
-            return JsonResponse(
-                {'status': 'error', 'message': 'Trip not found'}, status=404
+            tolerance = self._get_tolerance(request)
+        except ValueError as ve:
+            return Response(
+                {'error': 'Invalid geometry resolution', 'detail': str(ve)},
+                status=status.HTTP_400_BAD_REQUEST,
             )
 
-        # Get all trip routes ordered by stop_order
-        trip_routes = trip.trip_routes.all().order_by('stop_order')
+        key = make_response_key('summary', request)
 
-        if not trip_routes.exists():
-            return Response(
-                {'detail': 'No route data found for this trip.'},
-                status=status.HTTP_404_NOT_FOUND,
+        cached = get_cached_response(key)
+        if cached is not None:
+            etag, response_data = cached
+
+            if etag_matches(request, etag):
+                return not_modified(etag)
+
+            return set_cache_headers(
+                Response(response_data, status=status.HTTP_200_OK), etag
             )
 
-        timeline = []
-        cumulative_duty_hrs = Decimal('0.0')
+        # The geometry level and leanness change the representation
+        etag = get_trip_etag(uid, 'summary', sorted(request.query_params.items()))
+
+        if etag is None:
+            return JsonResponse(
+                {'status': 'error', 'message': 'Trip not found'}, status=404
+            )
 
-        for route in trip_routes:
-            # Calculate duration in hours
-            duration = route.estimated_departure - route.estimated_arrival
-            duration_hrs = Decimal(str(duration.total_seconds() / 3600))
+        if etag_matches(request, etag):
+            return not_modified(etag)
 
-            # Determine status based on stop type
-            status_type = self._get_status_type(route.stop_type)
+        lean = is_lean(request)
+        queryset = Trip.objects.filter(id=uid)
 
-            # Update cumulative duty hours (only for on-duty activities)
-            if status_type in ['DRIVING', 'ON_DUTY']:
-                cumulative_duty_hrs += duration_hrs
+        if not lean:
+            queryset = queryset.prefetch_related('daily_logs', 'trip_routes')
 
-            # Create timeline entry
-            timeline_entry = {
-                'time': route.estimated_arrival.isoformat(),
-                'duty_hrs': float(cumulative_duty_hrs),
-                'status': status_type,
-                'activity': self._get_activity_description(route),
-                'duration_hrs': float(duration_hrs),
-            }
+        trip = queryset.first()
+        if trip is None:
+            return JsonResponse(
+                {'status': 'error', 'message': 'Trip not found'}, status=404
+            )
 
-            timeline.append(timeline_entry)
+        # Trips calculated before the timeline was stored get it on first read
+        if trip.timeline is None:
+            trip.timeline = timeline_from_routes(
+                trip.trip_routes.all().order_by('stop_order')
+            )
+            Trip.objects.filter(id=trip.id).update(timeline=trip.timeline)
+
+        if not trip.timeline:
+            return Response(
+                {'detail': 'No route data found for this trip.'},
+                status=status.HTTP_404_NOT_FOUND,
+            )
+
+        serializer_class = TripListSerializer if lean else TripSerializer
 
         response_data = {
             'status': 'success',
             'data': {
-                **TripSerializer(trip).data,
-                'timeline': timeline,
-                'geojson': trip.route_data,
+                **serializer_class(trip).data,
+                'timeline': expand_timeline(trip.timeline),
+                'geojson': self._get_geojson(trip, tolerance),
             },
         }
+        cache_response(key, (etag, response_data))
+
+        return set_cache_headers(
+            Response(response_data, status=status.HTTP_200_OK), etag
+        )
 
-        return Response(response_data, status=status.HTTP_200_OK)
+
+class TripJobView(APIView):
+    def get(self, request, uid):
+        """Status of a queued calculation, with the trip once it is done."""
+        job = get_object_or_404(
+            TripJob.objects.select_related('trip').prefetch_related(
+                'trip__daily_logs', 'trip__trip_routes'
+            ),
+            id=uid,
+        )
+
+        return Response(TripJobSerializer(job).data, status=status.HTTP_200_OK)
+
+
+class TripStatsView(APIView):
+    """
+    Counters of the worker answering the request, for staff: the counts are
+    kept per process, so each worker reports its own.
+    """
+
+    permission_classes = [IsAdminUser]
+
+    def get(self, request):
+        return Response(
+            {
+                'route_cache': route_cache.stats(),
+                'ors_http': ors_http_stats(),
+                'ors_breaker': ORS_BREAKER.stats(),
+            },
+            status=status.HTTP_200_OK,
+        )